@@ -10,9 +10,71 @@ __version__ = "1.0.0"
 __status__ = "Development"
 
 import argparse
+import functools
+import multiprocessing
 import os
+import sys
+import time
 import cv2
+import numpy as np
 import pose
+import posecache
+import poserecords
+
+# Pose solver and cache for this process. Each worker makes them in
+# init_worker() so the calibration and undistort maps are only set up
+# once.
+worker_pose = None
+worker_cache = None
+
+def init_worker(args, single_thread=True):
+    """Set up a worker process."""
+    global worker_pose, worker_cache
+    if single_thread:
+        # Parallelism comes from the processes, so keep OpenCV to one
+        # thread in each.
+        cv2.setNumThreads(1)
+    pose.set_calibration(args.calibration)
+    pose.set_profile(args.profile)
+    pose.set_dictionary(args.dictionary)
+    worker_pose = pose.Pose(args.undistort)
+    if args.cache:
+        worker_cache = posecache.PoseCache(
+            args.cache, posecache.settings_key(worker_pose, args.id))
+
+def process_file(args, name):
+    """Solve one image, write its result image unless turned off and
+       return its pose record and whether it came from the cache."""
+    with open(args.source + '/' + name, 'rb') as f:
+        data = f.read()
+    key = None
+    if worker_cache:
+        key = worker_cache.key(data)
+        record = worker_cache.get(key, name)
+        if record is not None:
+            return record, True
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    worker_pose.solve(frame, args.id)
+    if not args.no_images:
+        cv2.imwrite(args.results + '/' + name, worker_pose.display_results())
+    record = poserecords.make_record(name, worker_pose)
+    if worker_cache:
+        worker_cache.put(key, record)
+    return record, False
+
+def process_files(args, names):
+    """Process names in order, yielding results as they finish."""
+    job = functools.partial(process_file, args)
+    if args.jobs <= 1:
+        init_worker(args, False)
+        for name in names:
+            yield job(name)
+        return
+    with multiprocessing.Pool(args.jobs, init_worker, (args,)) as pool:
+        # imap keeps the results in the order of names while the
+        # workers read, solve and write ahead of it.
+        for result in pool.imap(job, names, args.chunk):
+            yield result
 
 def main():
     """Execute the command"""
@@ -26,20 +88,86 @@ def main():
     parser.add_argument('-s', '--source',
                         help='source directory for images',
                         required=False, default='images')
+    parser.add_argument('-u', '--undistort',
+                        help='undistort the whole image or just corners',
+                        required=False, choices=pose.UNDISTORT_MODES,
+                        default=pose.UNDISTORT_IMAGE)
+    parser.add_argument('--calibration',
+                        help='camera calibration file',
+                        required=False, default=pose.CALIBRATION_FILE)
+    parser.add_argument('--profile',
+                        help='Aruco detector profile',
+                        required=False, choices=list(pose.DETECTOR_PROFILES),
+                        default=pose.DEFAULT_PROFILE)
+    parser.add_argument('--dictionary',
+                        help='Aruco dictionary: %s or a number N for the '
+                        'first N markers of 6x6_250' %
+                        ', '.join(pose.DICTIONARIES),
+                        required=False, default=pose.DEFAULT_DICTIONARY)
+    parser.add_argument('-j', '--jobs',
+                        help='worker processes (1 for no workers)',
+                        required=False, type=int, default=os.cpu_count())
+    parser.add_argument('-c', '--chunk',
+                        help='images handed to a worker at a time',
+                        required=False, type=int, default=4)
+    parser.add_argument('-n', '--no-images',
+                        help='do not write result images',
+                        required=False, action='store_true')
+    parser.add_argument('-o', '--output',
+                        help='pose records file ending in .csv or .npz',
+                        required=False, default=None)
+    parser.add_argument('--cache',
+                        help='directory caching poses of unchanged images '
+                        '(needs --no-images)',
+                        required=False, default=None)
+    parser.add_argument('--cache-size',
+                        help='cache size limit in MB',
+                        required=False, type=float, default=64.0)
     args = parser.parse_args()
 
+    # A cached pose has no result image to write.
+    if args.cache and not args.no_images:
+        print("--cache needs --no-images")
+        sys.exit(2)
+
     # Make sure output directory exists before we start.
-    try:
-        os.mkdir(args.results)
-    except FileExistsError:
-        pass
+    if not args.no_images:
+        try:
+            os.mkdir(args.results)
+        except FileExistsError:
+            pass
 
     # Process files.
-    p = pose.Pose()
-    for name in os.listdir(args.source):
-        frame = cv2.imread(args.source + '/' + name)
-        p.solve(frame, args.id)
-        cv2.imwrite(args.results + '/' + name, p.display_results())
+    names = sorted(os.listdir(args.source))
+    records = None
+    if args.output:
+        records = poserecords.PoseRecords(args.output)
+    cache = None
+    if args.cache:
+        # Workers write the entries; pruning them here keeps it to one
+        # process and counts every eviction.
+        cache = posecache.PoseCache(args.cache, '', args.cache_size*1024*1024)
+    start = time.monotonic()
+    found = 0
+    for record, hit in process_files(args, names):
+        found += record[1]
+        if cache:
+            if hit:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+                if cache.misses % posecache.PRUNE_EVERY == 0:
+                    cache.prune()
+        if records:
+            records.add(record)
+    if records:
+        records.close()
+    elapsed = time.monotonic() - start
+    print("%d images, %d found, %.2f s, %.1f images/s" % (
+        len(names), found, elapsed, len(names)/max(elapsed, 1e-9)))
+    if cache:
+        cache.prune()
+        print(cache.stats())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""Compare Aruco dictionaries for identification time and false matches.
+
+Each dictionary ('--dictionaries', named as for pose.make_dictionary())
+detects markers in two image sets. The test images ('--source') show
+how long detection takes and that the gate is still found. Decoy
+images hold a grid of '--decoys' random 6x6 bit patterns drawn like
+markers, with blur and noise. Every one of them becomes a candidate
+that is compared against the whole dictionary, so they show the
+identification cost, and any decoy identified as a marker is a false
+positive. A smaller dictionary has fewer markers for a random pattern
+to land within error correction distance of, and the false positives
+expected from that are printed next to the ones counted.
+
+The candidates' bits are read before the dictionary is searched and
+that dominates, so detection time hardly changes with the dictionary.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import math
+import os
+import cv2
+import numpy as np
+import pose
+
+def make_decoys(count, per_image, rng, size=pose.CALIBRATION_SIZE,
+                blur=0.7, noise=3.0):
+    """Return count gray images each with a grid of per_image random
+       6x6 bit patterns with a black border, like 6x6 markers."""
+    w, h = size
+    cols = int(np.ceil(np.sqrt(per_image*w/h)))
+    rows = int(np.ceil(per_image/cols))
+    cell = min(w//cols, h//rows)
+    side = cell*3//4
+    images = []
+    for _ in range(count):
+        gray = np.full((h, w), 255, np.uint8)
+        for i in range(per_image):
+            bits = np.zeros((8, 8), np.uint8)
+            bits[1:7, 1:7] = rng.randint(0, 2, (6, 6))*255
+            marker = cv2.resize(bits, (side, side),
+                                interpolation=cv2.INTER_NEAREST)
+            x = (i % cols)*cell + (cell - side)//2
+            y = (i//cols)*cell + (cell - side)//2
+            gray[y:y+side, x:x+side] = marker
+        gray = cv2.GaussianBlur(gray, (0, 0), blur)
+        noisy = gray + rng.standard_normal((h, w))*noise
+        images.append(np.clip(noisy, 0, 255).astype(np.uint8))
+    return images
+
+def binomial(n, k):
+    """Return n choose k. math.comb() needs Python 3.8."""
+    return math.factorial(n)//(math.factorial(k)*math.factorial(n - k))
+
+def expected_false(d, params):
+    """Return the chance a random pattern is identified as a marker of
+       dictionary d in any of its four rotations."""
+    bits = d.markerSize*d.markerSize
+    correct = int(d.maxCorrectionBits*params.errorCorrectionRate)
+    near = sum(binomial(bits, k) for k in range(correct + 1))
+    return min(len(d.bytesList)*4*near/2.0**bits, 1.0)
+
+def detect_all(grays, repeat):
+    """Return (ms per image, list of ID arrays) detecting in grays."""
+    ids = []
+    ms = 0.0
+    for gray in grays:
+        e1 = cv2.getTickCount()
+        for _ in range(repeat):
+            markers = pose.detect_all_markers(gray)
+        ms += (cv2.getTickCount() - e1)/cv2.getTickFrequency()*1000/repeat
+        ids.append(markers)
+    return ms/max(len(grays), 1), ids
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Benchmark dictionaries')
+    parser.add_argument('-i', '--id',
+                        help='marker ID of the gate in the test images',
+                        required=False, type=int, default=2)
+    parser.add_argument('-s', '--source',
+                        help='source directory for images',
+                        required=False, default='images')
+    parser.add_argument('-d', '--dictionaries',
+                        help='comma separated dictionaries to compare',
+                        required=False, default='6x6_250,6x6_50,3')
+    parser.add_argument('--images',
+                        help='decoy images',
+                        required=False, type=int, default=200)
+    parser.add_argument('--decoys',
+                        help='random patterns per decoy image',
+                        required=False, type=int, default=48)
+    parser.add_argument('-n', '--repeat',
+                        help='times to repeat each detection',
+                        required=False, type=int, default=3)
+    parser.add_argument('--seed',
+                        help='random seed',
+                        required=False, type=int, default=1)
+    args = parser.parse_args()
+
+    names = sorted(os.listdir(args.source))
+    grays = [pose.create_gray_frame(cv2.imread(os.path.join(args.source,
+                                                            name)))
+             for name in names]
+    decoys = make_decoys(args.images, args.decoys,
+                         np.random.RandomState(args.seed))
+    total = args.images*args.decoys
+
+    print('%-10s %7s %9s %6s %9s %6s %9s %9s' % (
+        'dictionary', 'markers', 'ms/image', 'found', 'ms/decoy', 'false',
+        'per 1000', 'expected'))
+    for name in args.dictionaries.split(','):
+        pose.set_dictionary(name)
+        ctx = pose.context()
+        markers = len(ctx.aruco_dict.bytesList)
+        expected = expected_false(ctx.aruco_dict, ctx.aruco_params)
+        pose.detect_all_markers(grays[0])      # Warm up.
+        image_ms, found = detect_all(grays, args.repeat)
+        found = sum(len(m.get(args.id, [])) == 2 for m in found)
+        decoy_ms, matched = detect_all(decoys, args.repeat)
+        false = sum(len(c) for m in matched for c in m.values())
+        print('%-10s %7d %9.3f %6d %9.3f %6d %9.3f %9.3f' % (
+            name, markers, image_ms, found, decoy_ms, false,
+            1000.0*false/total, 1000.0*expected))
+
+if __name__ == "__main__":
+    main()
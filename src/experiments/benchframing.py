@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""Compare the text and binary stick command encodings.
+
+For each encoding it shows the frame size over a sweep of stick
+values, the command rate the serial link can carry at that size, and
+how long Python takes to build a frame.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import time
+import numpy as np
+import command
+
+ENCODINGS = (('text', command.encode_text),
+             ('binary', command.encode_binary))
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Benchmark command framing')
+    parser.add_argument('-b', '--baud',
+                        help='serial baud rate',
+                        required=False, type=int, default=115200)
+    parser.add_argument('-n', '--repeat',
+                        help='frames to encode for timing',
+                        required=False, type=int, default=20000)
+    args = parser.parse_args()
+
+    # 8N1 serial sends ten bits for every byte.
+    bytes_per_second = args.baud/10
+    values = np.random.RandomState(0).uniform(-1.0, 1.0, (args.repeat, 4))
+
+    print('%-8s %6s %6s %6s %12s %12s' % ('encoding', 'min', 'avg', 'max',
+                                          'max cmd/s', 'encode us'))
+    for name, encode in ENCODINGS:
+        sizes = np.array([len(encode(*v)) for v in values])
+        t = time.perf_counter()
+        for v in values:
+            encode(*v)
+        us = (time.perf_counter() - t)/len(values)*1e6
+        print('%-8s %6d %6.1f %6d %12.0f %12.2f' % (
+            name, sizes.min(), sizes.mean(), sizes.max(),
+            bytes_per_second/sizes.max(), us))
+    print()
+    print('The transmitter sends a radio update every %.0f ms (%.0f/s).' % (
+        command.AsyncCommand.UPDATE_PERIOD*1000,
+        1/command.AsyncCommand.UPDATE_PERIOD))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""Benchmark the pose pipeline and compare against saved runs.
+
+Times create_gray_frame(), detect_markers(), position_markers() and a
+full Pose.solve() over the images in a directory, at their own size
+and at each '--resolutions' size the images are scaled to. Every
+function is first run '--warmup' times over the images, so caches
+such as the undistort maps are filled, then timed call by call
+'--repeat' times. The latency distribution and throughput of each
+function are printed and can be saved as JSON with '--save'. The
+calibration is for the camera's own size, so scaled images are only
+good for timing; position_markers() runs on the images where both
+markers were still found.
+
+'--compare BASE.json' compares this run against a saved one and
+'--compare OLD.json NEW.json' compares two saved runs without running.
+A function whose median time grew by more than '--threshold' percent
+is flagged as a regression and the exit status is 1.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+import pose
+
+def time_calls(func, inputs, warmup, repeat):
+    """Return milliseconds of every call of func on each of inputs,
+       repeated repeat times after warmup untimed passes."""
+    for _ in range(warmup):
+        for value in inputs:
+            func(value)
+    ms = np.zeros(repeat*len(inputs))
+    i = 0
+    for _ in range(repeat):
+        for value in inputs:
+            t = time.perf_counter()
+            func(value)
+            ms[i] = (time.perf_counter() - t)*1000
+            i += 1
+    return ms
+
+def summarize(ms):
+    """Return the statistics of call times ms."""
+    if len(ms) == 0:
+        return {'calls': 0}
+    return {'calls': len(ms),
+            'mean_ms': float(ms.mean()),
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)),
+            'min_ms': float(ms.min()),
+            'max_ms': float(ms.max()),
+            'per_second': float(1000/ms.mean())}
+
+def load_images(source, size):
+    """Return the images in directory source, scaled to size if given."""
+    frames = []
+    for name in sorted(os.listdir(source)):
+        frame = cv2.imread(os.path.join(source, name))
+        if frame is None:
+            continue
+        if size is not None:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    return frames
+
+def run_size(frames, marker_id, warmup, repeat):
+    """Return results by function name for frames of one size."""
+    grays = [pose.create_gray_frame(frame) for frame in frames]
+    pairs = []
+    for gray in grays:
+        corners, _ = pose.detect_markers(gray, marker_id)
+        if len(corners) == 2:
+            pairs.append(corners)
+    size = grays[0].shape[1::-1]
+    p = pose.Pose()
+    results = {
+        'create_gray_frame': time_calls(pose.create_gray_frame, frames,
+                                        warmup, repeat),
+        'detect_markers': time_calls(
+            lambda gray: pose.detect_markers(gray, marker_id), grays,
+            warmup, repeat),
+        'position_markers': time_calls(
+            lambda corners: pose.position_markers(corners, size=size),
+            pairs, warmup, repeat),
+        'solve': time_calls(lambda frame: p.solve(frame, marker_id), frames,
+                            warmup, repeat),
+    }
+    results = {name: summarize(ms) for name, ms in results.items()}
+    results['detect_markers']['found'] = len(pairs)
+    results['detect_markers']['images'] = len(grays)
+    return results
+
+def run(args):
+    """Run the benchmark and return its results."""
+    sizes = [None]
+    if args.resolutions:
+        sizes += [tuple(int(v) for v in size.split('x'))
+                  for size in args.resolutions.split(',')]
+    benchmarks = {}
+    for size in sizes:
+        frames = load_images(args.source, size)
+        if not frames:
+            print("No images in %s" % args.source)
+            break
+        h, w = frames[0].shape[:2]
+        for name, result in run_size(frames, args.id, args.warmup,
+                                     args.repeat).items():
+            benchmarks['%s@%dx%d' % (name, w, h)] = result
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'source': args.source,
+            'warmup': args.warmup,
+            'repeat': args.repeat,
+            'benchmarks': benchmarks}
+
+def report(results):
+    """Print the results of a run."""
+    print('%-32s %6s %8s %8s %8s %8s %8s' % ('function', 'calls', 'mean ms',
+                                             'p50 ms', 'p95 ms', 'max ms',
+                                             'per sec'))
+    for name, r in results['benchmarks'].items():
+        if r['calls'] == 0:
+            print('%-32s %6d' % (name, 0))
+            continue
+        print('%-32s %6d %8.3f %8.3f %8.3f %8.3f %8.1f' % (
+            name, r['calls'], r['mean_ms'], r['p50_ms'], r['p95_ms'],
+            r['max_ms'], r['per_second']))
+
+def compare(base, new, threshold):
+    """Print median changes from base to new results and return the
+       number of regressions over threshold percent."""
+    regressions = 0
+    print('%-32s %8s %8s %8s' % ('function', 'base ms', 'new ms', 'change'))
+    for name, r in new['benchmarks'].items():
+        b = base['benchmarks'].get(name)
+        if b is None or b['calls'] == 0 or r['calls'] == 0:
+            print('%-32s %8s' % (name, 'missing'))
+            continue
+        change = (r['p50_ms'] - b['p50_ms'])/b['p50_ms']*100
+        flag = ''
+        if change > threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        elif change < -threshold:
+            flag = 'faster'
+        print(('%-32s %8.3f %8.3f %+7.1f%% %s' % (
+            name, b['p50_ms'], r['p50_ms'], change, flag)).rstrip())
+    return regressions
+
+def load(filename):
+    """Return results saved in JSON file filename."""
+    with open(filename) as f:
+        return json.load(f)
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Benchmark pose pipeline')
+    parser.add_argument('-i', '--id',
+                        help='marker ID to find',
+                        required=False, type=int, default=2)
+    parser.add_argument('-s', '--source',
+                        help='source directory for images',
+                        required=False, default='images')
+    parser.add_argument('-r', '--resolutions',
+                        help='comma separated WxH sizes to also scale the '
+                        'images to, e.g. 320x240,1280x960',
+                        required=False, default=None)
+    parser.add_argument('-w', '--warmup',
+                        help='untimed passes before timing',
+                        required=False, type=int, default=3)
+    parser.add_argument('-n', '--repeat',
+                        help='timed passes over the images',
+                        required=False, type=int, default=20)
+    parser.add_argument('-o', '--save',
+                        help='JSON file to save the results in',
+                        required=False, default=None)
+    parser.add_argument('-c', '--compare',
+                        help='saved results to compare this run against, or '
+                        'two saved results to compare',
+                        required=False, nargs='+', default=None)
+    parser.add_argument('-t', '--threshold',
+                        help='percent slower that counts as a regression',
+                        required=False, type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        print("--compare takes one or two files")
+        sys.exit(2)
+    if args.compare and len(args.compare) == 2:
+        base, new = load(args.compare[0]), load(args.compare[1])
+    else:
+        new = run(args)
+        report(new)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(new, f, indent=2)
+        if not args.compare:
+            return
+        base = load(args.compare[0])
+        print()
+    if compare(base, new, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
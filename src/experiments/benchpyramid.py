@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Compare marker detection on pyramid levels over a directory of images.
+
+For every image, detection runs at each pyramid level up to
+pose.Pose.PYRAMID_MAX_LEVEL with the corners refined back at full
+resolution. The detection time is shown along with how far the corners
+and the solvePnP pose move from the full resolution (level 0) answer.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import math
+import os
+import cv2
+import numpy as np
+import pose
+
+def time_ms(func, repeat):
+    """Return average milliseconds to call func."""
+    e1 = cv2.getTickCount()
+    for _ in range(repeat):
+        func()
+    return (cv2.getTickCount() - e1)/cv2.getTickFrequency()*1000/repeat
+
+def rotation_diff(rvecs1, rvecs2):
+    """Return the angle in degrees between two rotation vectors."""
+    r1, _ = cv2.Rodrigues(rvecs1)
+    r2, _ = cv2.Rodrigues(rvecs2)
+    r, _ = cv2.Rodrigues(r1.T.dot(r2))
+    return np.linalg.norm(r)*180/math.pi
+
+def ordered(corners):
+    """Return corners as one array with the markers left to right."""
+    return np.concatenate(sorted(corners, key=lambda c: c[0][0][0]))
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Benchmark pyramid detection')
+    parser.add_argument('-i', '--id',
+                        help='marker ID to find',
+                        required=False, type=int, default=2)
+    parser.add_argument('-n', '--repeat',
+                        help='times to repeat each measurement',
+                        required=False, type=int, default=20)
+    parser.add_argument('-s', '--source',
+                        help='source directory for images',
+                        required=False, default='images')
+    args = parser.parse_args()
+
+    levels = range(pose.Pose.PYRAMID_MAX_LEVEL + 1)
+    ms = np.zeros(len(levels))
+    found = np.zeros(len(levels), int)
+    errors = [[] for _ in levels]
+    print('%-20s %5s %8s %5s %10s %10s %10s' % ('image', 'level', 'ms',
+                                                'found', 'corner px',
+                                                'tvec cm', 'rvec deg'))
+    names = sorted(os.listdir(args.source))
+    for name in names:
+        gray = pose.create_gray_frame(cv2.imread(args.source + '/' + name))
+        base = None
+        for level in levels:
+            t = time_ms(lambda: pose.detect_markers(gray, args.id, level),
+                        args.repeat)
+            ms[level] += t
+            corners, _ = pose.detect_markers(gray, args.id, level)
+            ok = len(corners) == 2
+            if ok:
+                ok, rvecs, tvecs = pose.position_markers(
+                    corners, size=gray.shape[1::-1])
+            found[level] += ok
+            line = '%-20s %5d %8.3f %5s' % (name, level, t, ok)
+            if level == 0 and ok:
+                base = (ordered(corners), rvecs, tvecs)
+            elif ok and base is not None:
+                err = (np.abs(ordered(corners) - base[0]).max(),
+                       np.linalg.norm(tvecs - base[2]),
+                       rotation_diff(rvecs, base[1]))
+                errors[level].append(err)
+                line += ' %10.3f %10.3f %10.3f' % err
+            print(line)
+
+    print()
+    print('%5s %8s %5s %10s %10s %10s' % ('level', 'avg ms', 'found',
+                                          'max px', 'max cm', 'max deg'))
+    for level in levels:
+        line = '%5d %8.3f %5d' % (level, ms[level]/max(1, len(names)),
+                                  found[level])
+        if errors[level]:
+            line += ' %10.3f %10.3f %10.3f' % tuple(np.max(errors[level], 0))
+        print(line)
+
+if __name__ == "__main__":
+    main()
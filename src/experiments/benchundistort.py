@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Compare undistortion strategies over a directory of images.
+
+Four ways of undistorting are timed:
+
+  undistort -- the original per-frame cv2.undistort() path.
+  color     -- cached maps remapping the color frame, then gray.
+  remap     -- gray first, then cached maps through cv2.remap().
+  corners   -- only undistort the detected marker corners.
+
+Then detection quality is reported for both pose.UNDISTORT_MODES so a
+mode can be chosen per course.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import os
+import cv2
+import numpy as np
+import pose
+
+def undistort_frame(frame):
+    """The original undistort path rebuilding the maps every frame."""
+    h, w = frame.shape[:2]
+    ctx = pose.context()
+    new_matrix, _ = cv2.getOptimalNewCameraMatrix(ctx.camera_matrix,
+                                                  ctx.dist_coeffs,
+                                                  (w, h), 1, (w, h))
+    fixed = cv2.undistort(frame, ctx.camera_matrix,
+                          ctx.dist_coeffs, None, new_matrix)
+    return cv2.cvtColor(fixed, cv2.COLOR_BGR2GRAY)
+
+def remap_color_frame(frame):
+    """Cached maps but remapping all three channels before gray."""
+    h, w = frame.shape[:2]
+    map1, map2, _ = pose.undistort_maps(w, h)
+    fixed = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+    return cv2.cvtColor(fixed, cv2.COLOR_BGR2GRAY)
+
+def time_ms(func, repeat):
+    """Return average milliseconds to call func."""
+    e1 = cv2.getTickCount()
+    for _ in range(repeat):
+        func()
+    return (cv2.getTickCount() - e1)/cv2.getTickFrequency()*1000/repeat
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Benchmark undistortion')
+    parser.add_argument('-i', '--id',
+                        help='marker ID to find',
+                        required=False, type=int, default=2)
+    parser.add_argument('-n', '--repeat',
+                        help='times to repeat each measurement',
+                        required=False, type=int, default=50)
+    parser.add_argument('-s', '--source',
+                        help='source directory for images',
+                        required=False, default='images')
+    args = parser.parse_args()
+
+    totals = np.zeros(4)
+    print('%-20s %10s %10s %10s %10s %8s' % ('image', 'undistort', 'color',
+                                             'remap', 'corners', 'speedup'))
+    names = sorted(os.listdir(args.source))
+    for name in names:
+        frame = cv2.imread(args.source + '/' + name)
+        h, w = frame.shape[:2]
+        raw = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        corners, _ = pose.detect_markers(raw, args.id)
+
+        # Sanity check that the remap matches the original.
+        diff = cv2.absdiff(undistort_frame(frame),
+                           pose.create_gray_frame(frame))
+        if diff.max() > 1:
+            print('%s: remap differs from undistort by %d' % (name, diff.max()))
+
+        ms = np.array([
+            time_ms(lambda: undistort_frame(frame), args.repeat),
+            time_ms(lambda: remap_color_frame(frame), args.repeat),
+            time_ms(lambda: pose.create_gray_frame(frame), args.repeat),
+            time_ms(lambda: pose.undistort_corners(corners, w, h), args.repeat)])
+        totals += ms
+        print('%-20s %10.3f %10.3f %10.3f %10.3f %7.1fx' % (
+            name, ms[0], ms[1], ms[2], ms[3], ms[0]/ms[2]))
+    if not names:
+        return
+    avg = totals/len(names)
+    print('%-20s %10.3f %10.3f %10.3f %10.3f %7.1fx' % (
+        'average', avg[0], avg[1], avg[2], avg[3], avg[0]/avg[2]))
+    report_detection(args, names)
+
+def report_detection(args, names):
+    """Show what each undistort mode detects and how the poses compare."""
+    print()
+    print('%-20s %7s %7s %7s %7s %9s' % ('image', 'image#', 'found',
+                                         'corner#', 'found', 'tvec diff'))
+    poses = [pose.Pose(mode) for mode in pose.UNDISTORT_MODES]
+    counts = np.zeros(len(poses), int)
+    for name in names:
+        frame = cv2.imread(args.source + '/' + name)
+        found = [p.solve(frame, args.id) for p in poses]
+        counts += found
+        diff = ''
+        if all(found):
+            diff = '%9.2f' % np.linalg.norm(poses[0].tvecs - poses[1].tvecs)
+        print('%-20s %7d %7s %7d %7s %9s' % (name,
+                                             len(poses[0].corners), found[0],
+                                             len(poses[1].corners), found[1],
+                                             diff))
+    print('%-20s %7s %7d %7s %7d' % ('found', '', counts[0], '', counts[1]))
+
+if __name__ == "__main__":
+    main()
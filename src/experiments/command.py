@@ -7,8 +7,20 @@ __license__ = "BSD 3-Clause License"
 __version__ = "1.0.0"
 __status__ = "Development"
 
+import collections
+import threading
 import time
 import serial
+import timing
+
+# Binary stick command framing. A frame is the sync byte, the four
+# 11-bit channels packed least significant bit first the way the radio
+# expects them, and a CRC-8 of the packed channels.
+SYNC = 0xA5
+CHANNEL_BITS = 11
+PAYLOAD_SIZE = 6
+BINARY_QUERY = b'B'             # Ask the transmitter for binary framing.
+BINARY_REPLY = b'BIN 1'         # Its answer when it supports it.
 
 class Command:
     """Drive the transmitter to command the quadcopter."""
@@ -16,12 +28,28 @@ class Command:
     MIN_VALUE = 204
     MAX_VALUE = 1844
 
-    def __init__(self, ttyname):
-        """Open serial using ttyname"""
+    NEGOTIATE_TIMEOUT = 0.5     # Seconds to wait for the binary reply.
+
+    def __init__(self, ttyname, negotiate=True):
+        """Open serial using ttyname. Use binary framing if negotiate
+           is True and the transmitter agrees to it."""
         self.serial = serial.Serial(ttyname)
         self.serial.write(b'\n')
+        self.binary = negotiate and self.negotiate()
+        self.encode = encode_binary if self.binary else encode_text
         self.disarm()
 
+    def negotiate(self):
+        """Ask the transmitter for binary framing. Return True if it
+           agreed, False to keep using text."""
+        self.serial.reset_input_buffer()
+        self.serial.write(BINARY_QUERY)
+        timeout = self.serial.timeout
+        self.serial.timeout = Command.NEGOTIATE_TIMEOUT
+        reply = self.serial.readline()
+        self.serial.timeout = timeout
+        return reply.strip() == BINARY_REPLY
+
     def bind(self):
         """Bind to quadcopter"""
         self.serial.write(b'q')
@@ -36,13 +64,141 @@ class Command:
         """Disarm and stop quadcopter"""
         self.serial.write(b'd')
 
+    def telemetry(self, on):
+        """Start or stop the transmitter forwarding telemetry"""
+        self.serial.write(b'T' if on else b't')
+
     def command(self, throttle, direction, forward, rotation):
         """Command each degree of freedom using value 0.0 to 1.0"""
-        cmd = b'!%d %d %d %d\n' % (normalize(throttle),
-                                   normalize(direction),
-                                   normalize(forward),
-                                   normalize(rotation))
-        self.serial.write(cmd)
+        t = timing.start()
+        data = self.encode(throttle, direction, forward, rotation)
+        timing.stop('encode', t)
+        t = timing.start()
+        self.serial.write(data)
+        timing.stop('serial', t)
+
+    def close(self):
+        """Close serial."""
+        self.serial.close()
+
+
+class AsyncCommand(Command):
+    """Drive the transmitter from a background writer thread.
+
+    Only the newest stick command is kept. One that has not been sent
+    when the next arrives is dropped. Stick commands go out at most once
+    per period, which defaults to the transmitter's channel update
+    period, and bind, arm and disarm return without waiting.
+    """
+
+    UPDATE_PERIOD = 0.009       # Matches msBetweenUpdates in transmitter.ino.
+
+    def __init__(self, ttyname, negotiate=True, period=UPDATE_PERIOD):
+        """Open serial using ttyname and start the writer"""
+        self.period = period
+        self.cond = threading.Condition()
+        self.actions = collections.deque()  # (bytes, seconds to hold).
+        self.latest = None      # Newest unsent stick command.
+        self.hold_until = 0.0   # No stick commands before this time.
+        self.running = True
+        self.sent = 0           # Stick commands written.
+        self.dropped = 0        # Stick commands replaced before writing.
+        Command.__init__(self, ttyname, negotiate)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def bind(self):
+        """Bind to quadcopter"""
+        self.queue_action(b'q', 1.0)
+        self.disarm()
+
+    def arm(self):
+        """Arm quadcopter for flight"""
+        self.queue_action(b'a')
+
+    def disarm(self):
+        """Disarm and stop quadcopter"""
+        with self.cond:
+            if self.latest is not None:
+                self.dropped += 1
+                self.latest = None
+        self.queue_action(b'd')
+
+    def telemetry(self, on):
+        """Start or stop the transmitter forwarding telemetry"""
+        self.queue_action(b'T' if on else b't')
+
+    def command(self, throttle, direction, forward, rotation):
+        """Command each degree of freedom using value 0.0 to 1.0"""
+        t = timing.start()
+        cmd = self.encode(throttle, direction, forward, rotation)
+        timing.stop('encode', t)
+        with self.cond:
+            if self.latest is not None:
+                self.dropped += 1
+            self.latest = cmd
+            self.cond.notify()
+
+    def queue_action(self, data, hold=0.0):
+        """Queue bytes to write in order, then hold off stick commands."""
+        with self.cond:
+            self.actions.append((data, hold))
+            self.cond.notify()
+
+    def queue_depth(self):
+        """Return number of writes waiting."""
+        with self.cond:
+            return len(self.actions) + (self.latest is not None)
+
+    def flush(self, timeout=None):
+        """Wait until all queued writes are done. Return True if done."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.actions or self.latest is not None:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def close(self):
+        """Finish queued writes, stop the writer and close serial."""
+        self.flush(1.0 + self.period)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join()
+        Command.close(self)
+
+    def run(self):
+        """Write queued actions and the newest stick command."""
+        next_time = time.monotonic()
+        while True:
+            with self.cond:
+                while self.running and not self.actions and self.latest is None:
+                    self.cond.wait()
+                if not self.running:
+                    break
+                now = time.monotonic()
+                data = None
+                if self.actions and now >= self.hold_until:
+                    data, hold = self.actions.popleft()
+                    self.hold_until = now + hold
+                elif (not self.actions and self.latest is not None and
+                      now >= self.hold_until and now >= next_time):
+                    data = self.latest
+                    self.latest = None
+                    self.sent += 1
+                    next_time = now + self.period
+                if data is None:
+                    wait = max(self.hold_until, next_time) - now
+                    self.cond.wait(max(wait, 0.001))
+                    continue
+            t = timing.start()
+            self.serial.write(data)
+            timing.stop('serial', t)
+            with self.cond:
+                self.cond.notify_all()
 
 def normalize(value):
     """Covert float into integer command value.
@@ -51,3 +207,54 @@ def normalize(value):
                max(Command.MIN_VALUE,
                    ((value+1.0)/2.0)*(Command.MAX_VALUE-Command.MIN_VALUE) +
                    Command.MIN_VALUE))
+
+
+def encode_text(throttle, direction, forward, rotation):
+    """Return text stick command."""
+    return b'!%d %d %d %d\n' % (normalize(throttle),
+                                normalize(direction),
+                                normalize(forward),
+                                normalize(rotation))
+
+
+def encode_binary(throttle, direction, forward, rotation):
+    """Return binary stick command frame."""
+    bits = 0
+    for i, value in enumerate((throttle, direction, forward, rotation)):
+        bits |= int(normalize(value)) << (i*CHANNEL_BITS)
+    payload = bits.to_bytes(PAYLOAD_SIZE, 'little')
+    return bytes((SYNC,)) + payload + bytes((crc8(payload),))
+
+
+def decode_binary(frame):
+    """Return the four channel values from a binary frame or None if
+       the frame is bad."""
+    if (len(frame) != PAYLOAD_SIZE + 2 or frame[0] != SYNC or
+            crc8(frame[1:-1]) != frame[-1]):
+        return None
+    bits = int.from_bytes(frame[1:-1], 'little')
+    mask = (1 << CHANNEL_BITS) - 1
+    return tuple((bits >> (i*CHANNEL_BITS)) & mask for i in range(4))
+
+
+def make_crc8_table():
+    """Return lookup table for CRC-8 (polynomial 0x07)."""
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x07) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+CRC8_TABLE = make_crc8_table()
+
+def crc8(data):
+    """Return CRC-8 (polynomial 0x07) of data."""
+    crc = 0
+    for b in data:
+        crc = CRC8_TABLE[crc ^ b]
+    return crc
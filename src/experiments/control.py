@@ -0,0 +1,92 @@
+"""Run the control loops at a fixed rate on their own thread.
+
+Without a controller Fly computes the PIDs and sends a stick command
+once per camera frame, so control runs no faster than the video and
+jitters with detection time. A Controller calls Fly.control() every
+1/rate seconds instead, using the newest gate pose from the vision
+thread. The PIDs are computed on every tick; pid.PID scales each term
+that adds to the output by the time since the last call, so the loop
+gains do not change with the rate. With Fly's pose filter ('--filter')
+the pose is predicted forward to the moment of each command, so the
+PIDs follow the gate between frames; without it the newest pose is
+held until it is MAX_POSE_AGE seconds old.
+
+Ticks are scheduled on absolute times so lateness does not add up.
+A tick more than a whole period late is skipped and counted. An error
+in a tick is printed and stops flying rather than ending the thread
+with the transmitter holding the last sticks.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import threading
+import time
+import traceback
+import timing
+
+MAX_POSE_AGE = 0.1  # Seconds to hold an unfiltered pose.
+
+class Controller:
+    """Timer thread calling Fly.control() at a fixed rate."""
+
+    RATE = 100.0        # Control updates per second.
+
+    def __init__(self, f, rate=RATE):
+        """Initialize controller for fly.Fly f."""
+        self.fly = f
+        self.period = 1.0/rate
+        self.running = False
+        self.thread = None
+        self.stopped = threading.Event()
+        self.ticks = 0          # Control updates run.
+        self.skipped = 0        # Ticks skipped because we fell behind.
+        self.max_late = 0.0     # Latest a tick started in seconds.
+
+    def start(self):
+        """Start the control thread."""
+        self.running = True
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the control thread."""
+        self.running = False
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        """Call Fly.control() every period until stopped."""
+        next_time = time.monotonic()
+        while self.running:
+            delay = next_time - time.monotonic()
+            if delay > 0 and self.stopped.wait(delay):
+                break
+            late = time.monotonic() - next_time
+            self.max_late = max(self.max_late, late)
+            if timing.enabled:
+                timing.add('control late', late*1000)
+            t = timing.start()
+            try:
+                self.fly.control(self.fly.now())
+            except Exception:
+                print("control failed, stopping flying:")
+                traceback.print_exc()
+                self.fly.stop_flying()
+            timing.stop('control', t)
+            self.ticks += 1
+            next_time += self.period
+            behind = int((time.monotonic() - next_time)/self.period)
+            if behind > 0:
+                self.skipped += behind
+                next_time += behind*self.period
+
+    def stats(self):
+        """Return text describing the control ticks."""
+        return "control ticks:%d skipped:%d max late:%.2f ms" % (
+            self.ticks, self.skipped, self.max_late*1000)
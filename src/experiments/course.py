@@ -0,0 +1,105 @@
+"""Course of gates, each marked by a pair of Aruco markers sharing an ID."""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import pose
+
+class Gate:
+    """One gate and the pose it was last seen at."""
+
+    def __init__(self, marker_id, objp):
+        """Initialize gate with its marker ID and 3D marker points."""
+        self.marker_id = marker_id
+        self.objp = objp        # 3D points as in pose.make_target_objp().
+        self.found = False      # True if found in the last frame.
+        self.rvecs = None       # Rotation vector when last found.
+        self.tvecs = None       # Translation vector when last found.
+        self.seen = None        # Time gate was last found.
+
+    def height(self):
+        """Return height offset to gate or 0.0 if not found."""
+        if self.found:
+            return self.tvecs[1][0]
+        return 0.0
+
+    def distance(self):
+        """Return forward distance to gate when last found."""
+        if self.tvecs is None:
+            return None
+        return self.tvecs[2][0]
+
+
+class Course:
+    """Gates flown in order, looked up by marker ID.
+
+    Every gate visible in a frame is solved from a single detection
+    pass, so the pose of the next gate is ready when the current one is
+    passed. After the last gate the course starts over for a new lap.
+    """
+
+    # A gate lost from view after being this close (cm) has been passed.
+    PASS_DISTANCE = 40.0
+
+    def __init__(self, marker_ids, objp=pose.Pose.target_objp):
+        """Initialize course with gates for marker_ids in flying order."""
+        self.order = []
+        self.gates = {}
+        self.index = 0
+        for marker_id in marker_ids:
+            self.add_gate(marker_id, objp)
+
+    def add_gate(self, marker_id, objp=pose.Pose.target_objp):
+        """Add a gate to the end of the course."""
+        self.order.append(marker_id)
+        self.gates[marker_id] = Gate(marker_id, objp)
+
+    def current(self):
+        """Return the gate being flown to."""
+        return self.gates[self.order[self.index]]
+
+    def next(self):
+        """Return the gate after the current one."""
+        return self.gates[self.order[(self.index + 1) % len(self.order)]]
+
+    def advance(self):
+        """Move on to the next gate."""
+        gate = self.current()
+        gate.rvecs = None
+        gate.tvecs = None
+        self.index = (self.index + 1) % len(self.order)
+
+    def update(self, p, now):
+        """Update all gates from the markers of a solved pose.Pose."""
+        for marker_id, gate in self.gates.items():
+            corners = p.markers.get(marker_id, [])
+            if marker_id == p.expected_id:
+                # Already solved by the pose.
+                found, rvecs, tvecs = p.found, p.rvecs, p.tvecs
+            elif len(corners) == 2:
+                h, w = p.gray.shape[:2]
+                found, rvecs, tvecs = pose.position_markers(
+                    corners, gate.objp, size=(w, h))
+            else:
+                found = False
+            gate.found = found
+            if found:
+                gate.rvecs = rvecs
+                gate.tvecs = tvecs
+                gate.seen = now
+
+    def next_found(self):
+        """Return True if the next gate but not the current one was
+           found in the last frame."""
+        return self.next().found and not self.current().found
+
+    def passed(self):
+        """Return True if the current gate has just been flown through."""
+        gate = self.current()
+        distance = gate.distance()
+        return (not gate.found and distance is not None and
+                distance < Course.PASS_DISTANCE)
@@ -97,6 +97,7 @@ def main():
             help();
         else:
             execute(c, text)
+    c.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""Stand in for the transmitter on a pseudo terminal.
+
+FakeTransmitter opens a pty and parses what arrives on it the way
+transmitter.ino does, recording every single character command and
+stick command with the time it arrived. Hand its 'ttyname' to
+command.Command to exercise the command code without hardware. Binary
+framing is offered unless it is made with binary=False.
+
+Run on its own it prints the tty name and logs what it receives.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import os
+import pty
+import select
+import threading
+import time
+import tty
+import command
+
+class FakeTransmitter:
+    """Stand in for the transmitter on a pseudo terminal."""
+
+    def __init__(self, verbose=False, binary=True):
+        """Open the pty and start reading it."""
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.ttyname = os.ttyname(self.slave)
+        self.verbose = verbose
+        self.binary = binary    # True to accept binary framing.
+        self.lock = threading.Lock()
+        self.chars = []         # (time, char) single character commands.
+        self.commands = []      # (time, throttle, direction, forward, spin).
+        self.received = 0       # Bytes received.
+        self.buffer = None      # Stick command being read or None.
+        self.frame = None       # Binary frame being read or None.
+        self.bad_frames = 0     # Binary frames that failed their CRC.
+        self.resync = False     # True after a bad frame until a sync byte.
+        self.telemetry = False  # True when asked to forward telemetry.
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stop reading and close the pty."""
+        self.running = False
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        """Read and parse bytes as they arrive."""
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            now = time.monotonic()
+            with self.lock:
+                self.received += len(data)
+                for b in data:
+                    self.process_byte(now, b)
+
+    def process_byte(self, now, b):
+        """Parse one byte like processCommand() in transmitter.ino."""
+        ch = chr(b)
+        if self.frame is not None:
+            self.frame.append(b)
+            if len(self.frame) == command.PAYLOAD_SIZE + 2:
+                values = command.decode_binary(bytes(self.frame))
+                self.frame = None
+                if values is None:
+                    self.bad_frames += 1
+                    self.resync = True
+                else:
+                    self.resync = False
+                    self.record(now, values)
+        elif self.resync:
+            # Only a sync byte or a disarm gets through.
+            if b == command.SYNC:
+                self.frame = bytearray((b,))
+            elif ch == 'd':
+                self.chars.append((now, ch))
+        elif self.buffer is not None:
+            if ch in '\r\n':
+                self.process_buffer(now, self.buffer)
+                self.buffer = None
+            else:
+                self.buffer += ch
+        elif ch == '!':
+            self.buffer = ''
+        elif self.binary and b == command.SYNC:
+            self.frame = bytearray((b,))
+        elif self.binary and ch == command.BINARY_QUERY.decode():
+            os.write(self.master, command.BINARY_REPLY + b'\r\n')
+        elif ch in 'Tt':
+            self.telemetry = ch == 'T'
+        elif ch not in '\r\n':
+            self.chars.append((now, ch))
+            if self.verbose:
+                print('%.3f %s' % (now, ch))
+
+    def process_buffer(self, now, text):
+        """Record a stick command."""
+        try:
+            values = [int(v) for v in text.split()]
+        except ValueError:
+            values = []
+        if len(values) != 4:
+            print('bad command: %r' % text)
+            return
+        self.record(now, values)
+
+    def record(self, now, values):
+        """Record stick command values."""
+        self.commands.append((now,) + tuple(values))
+        if self.verbose:
+            print('%.3f %d %d %d %d' % ((now,) + tuple(values)))
+
+    def send_telemetry(self, sensor_id, value):
+        """Send a telemetry sample like sportProcessPacket() if it has
+           been asked for. Return True if sent."""
+        if not self.telemetry:
+            return False
+        ms = int(time.monotonic()*1000) & 0xFFFFFFFF
+        os.write(self.master, b'T %d %d %d\r\n' % (ms, sensor_id, value))
+        return True
+
+    def wait_for_commands(self, count, timeout=1.0):
+        """Wait for count stick commands. Return True if they arrived."""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            with self.lock:
+                if len(self.commands) >= count:
+                    return True
+            time.sleep(0.001)
+        return False
+
+
+def main():
+    """Execute the command"""
+    t = FakeTransmitter(True)
+    print('Listening on', t.ttyname)
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        t.close()
+
+if __name__ == "__main__":
+    main()
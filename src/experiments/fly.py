@@ -7,90 +7,384 @@ __license__ = "BSD 3-Clause License"
 __version__ = "1.0.0"
 __status__ = "Development"
 
+import math
+import threading
 import command
+import control
+import course
 import cv2
+import numpy as np
 import pid
 import pose
+import posefilter
+import recorder
+import telemetry
+import timing
 
 class Fly:
     """Basic flying code."""
 
     MAX_ALLOWED_MISSES = 10
 
+    # After MAX_ALLOWED_MISSES frames without the gate, turn at this
+    # rotation towards where it was last seen, stopping if it is not
+    # found in SEARCH_TIME seconds.
+    SEARCH_ROTATION = 0.3
+    SEARCH_TIME = 8.0
+
+    # Limits of the lateral, forward and yaw PID inputs. Proportional on
+    # measurement adds kp times each change of input, which only sums
+    # to kp times the input while the output is not clipped.
+    MAX_OFFSET = 50.0       # cm off the gate's center line.
+    MAX_DISTANCE = 125.0    # cm to the gate.
+    MAX_BEARING = 50.0      # degrees to the gate.
+
+    # Fly to a point this far (cm) past the gate so we do not stall in it.
+    FORWARD_PAST = 50.0
+
     def __init__(self, parser):
         """Initialize the flying code."""
         self.pose = pose.Pose()
         self.cmd = None
-        self.marker_id = 0
+        self.clock = None       # Function returning the time, if not real.
+        self.telemetry = None
+        self.acceleration = None  # Newest (time, x, y, z) in g or None.
+        self.course = None
+        self.filter = None      # posefilter.PoseFilter if filtering.
+        self.estimate = None    # Gate (tvecs, rvecs) flown by or None.
+        self.estimate_time = 0.0  # Time of the frame estimate is from.
+        self.controller = None  # control.Controller, None to control
+                                # once per frame.
+        # Guards the estimate, PID and transmitter between the vision
+        # and control threads.
+        self.lock = threading.RLock()
+        self.recorder = None
+        self.last_command = (0.0, 0.0, 0.0, 0.0)
         self.flying = False
         self.armed = False
         self.image_count = 0
+        self.first_solved = None  # Seconds from process start to the
+                                  # first gate found.
         self.height_pid = pid.PID(False)
         self.height_pid.set_set_point(20.0)  # We want to get to height of gate.
         self.height_pid.set_output_limits(-1.0, 1.0)
         self.height_pid.set_initial_output(-1.0)
-        self.height_pid.set_tunings(0.02, 0.0, 0.0, True)
+        # kp per second, the old 0.02 per frame at 30 frames/s.
+        self.height_pid.set_tunings(0.6, 0.0, 0.0, True)
+        # Right of the gate's center line (cm) moves left onto it.
+        self.lateral_pid = make_pid(True, -0.5, 0.5, 0.01, 0.0005)
+        # Gate distance (cm) flies forward, never backward.
+        self.forward_pid = make_pid(False, 0.0, 0.5, 0.004, 0.002)
+        # Gate to the right (degrees) turns right to keep it centered.
+        self.yaw_pid = make_pid(False, -0.5, 0.5, 0.01, 0.0005)
+        self.height_only = False  # True to fly only the throttle.
         self.missed_data = 0
+        self.search_start = None  # Time the search for the gate began.
+        self.search_rotation = 0.0
         parser.add_argument('-i', '--id',
                             help='marker ID to find',
                             required=False, type=int, default=2)
+        parser.add_argument('-g', '--gates',
+                            help='comma separated gate marker IDs in flying '
+                            'order (defaults to just --id)',
+                            required=False, default=None)
+        parser.add_argument('--calibration',
+                            help='camera calibration file',
+                            required=False, default=pose.CALIBRATION_FILE)
+        parser.add_argument('--profile',
+                            help='Aruco detector profile',
+                            required=False,
+                            choices=list(pose.DETECTOR_PROFILES),
+                            default=pose.DEFAULT_PROFILE)
+        parser.add_argument('--dictionary',
+                            help='Aruco dictionary: %s, a number N for the '
+                            'first N markers of 6x6_250 or "course" for '
+                            'just enough for the gates' %
+                            ', '.join(pose.DICTIONARIES),
+                            required=False, default=pose.DEFAULT_DICTIONARY)
         parser.add_argument('-t', '--ttyname',
                             help='Serial tty to transmitter.',
                             required=False,
                             default='/dev/ttyACM0')
+        parser.add_argument('--async-command',
+                            help='write to the transmitter from a '
+                            'background thread',
+                            required=False, action='store_true')
+        parser.add_argument('--telemetry',
+                            help='read accelerometer telemetry',
+                            required=False, action='store_true')
+        parser.add_argument('-u', '--undistort',
+                            help='undistort the whole image or just corners',
+                            required=False, choices=pose.UNDISTORT_MODES,
+                            default=pose.UNDISTORT_IMAGE)
+        parser.add_argument('-k', '--track',
+                            help='search near the last markers first '
+                            '(single gate only)',
+                            required=False, action='store_true')
+        parser.add_argument('-p', '--pyramid',
+                            help='detect on a downscaled image when close',
+                            required=False, action='store_true')
+        parser.add_argument('--filter',
+                            help='filter the gate pose and predict it '
+                            'through missed frames',
+                            required=False, action='store_true')
+        parser.add_argument('--height-only',
+                            help='only control the throttle',
+                            required=False, action='store_true')
+        parser.add_argument('--control-rate',
+                            help='run control at this many updates per '
+                            'second instead of once per frame',
+                            required=False, type=float, default=0.0)
+        parser.add_argument('--record',
+                            help='directory to record the flight into',
+                            required=False, default=None)
+        parser.add_argument('--record-every',
+                            help='record every Nth frame',
+                            required=False, type=int, default=1)
 
     def now(self):
+        """Return the time in seconds from clock or the real time."""
+        if self.clock:
+            return self.clock()
         return cv2.getTickCount() / cv2.getTickFrequency()
 
-    def setup(self, args):
-        self.cmd = command.Command(args.ttyname)
-        self.marker_id = args.id
+    def setup(self, args, cmd=None):
+        """Set up from parsed args, flying with cmd instead of opening
+           the transmitter if it is given."""
+        if args.gates:
+            ids = [int(i) for i in args.gates.split(',')]
+        else:
+            ids = [args.id]
+        pose.set_calibration(args.calibration)
+        pose.set_profile(args.profile)
+        if args.dictionary == 'course':
+            pose.set_dictionary(pose.course_dictionary(ids))
+        else:
+            pose.set_dictionary(args.dictionary)
+        print("pose warmup %.1f ms" % (pose.context().warmup()*1000))
+        if cmd:
+            self.cmd = cmd
+        elif args.async_command:
+            self.cmd = command.AsyncCommand(args.ttyname)
+        else:
+            self.cmd = command.Command(args.ttyname)
+        if args.telemetry:
+            self.telemetry = telemetry.Telemetry(self.cmd)
+            self.telemetry.start()
+        self.course = course.Course(ids)
+        self.pose.undistort = args.undistort
+        # The tracking box would leave out the next gate of a course.
+        self.pose.track = args.track and len(ids) == 1
+        if args.track and len(ids) > 1:
+            print("--track is off for a course of %d gates" % len(ids))
+        self.pose.pyramid = args.pyramid
+        if args.filter:
+            self.filter = posefilter.PoseFilter()
+        self.height_only = args.height_only
+        if args.control_rate > 0:
+            self.controller = control.Controller(self, args.control_rate)
+            self.controller.start()
+        if args.record:
+            self.recorder = recorder.Recorder(args.record,
+                                              frame_every=args.record_every)
+            self.recorder.start()
 
     def process(self, frame):
         """Process new frame, update flight parameters, and return results."""
-        found = self.pose.solve(frame, self.marker_id)
+        self.update(frame)
+        return self.pose.display_results()
+
+    def update(self, frame):
+        """Process new frame and update flight parameters."""
+        guess = None
+        if self.filter:
+            guess = self.filter.predict(self.now())
+        t = timing.start()
+        self.pose.solve(frame, self.course.current().marker_id, guess)
+        timing.stop('solve', t)
+        now = self.now()
+        if self.pose.found and self.first_solved is None:
+            self.first_solved = timing.since_start()
+            print("first gate solved %.2f s after start" % self.first_solved)
+        if self.telemetry:
+            self.acceleration = self.telemetry.latest_acceleration()
+        t = timing.start()
+        self.course.update(self.pose, now)
+        timing.stop('course', t)
+        # Finding the next gate while searching for the current one
+        # means it was flown through or by without being seen to go.
+        if self.course.passed() or (self.search_start is not None and
+                                    self.course.next_found()):
+            self.course.advance()
+            if self.filter:
+                with self.lock:
+                    self.filter.reset()
+            print("passed gate, next gate %d" % self.course.current().marker_id)
+        gate = self.course.current()
+        with self.lock:
+            self.update_estimate(gate, now)
         if self.flying:
-            if found:
-                h = self.pose.height()
-                v = 0.0
-                if h is not None:
-                    v = self.height_pid.compute(self.now(), h)
-                self.cmd.command(v, 0.0, 0.0, 0.0)
+            if gate.found:
                 self.missed_data = 0
-            else:
+                self.search_start = None
+            elif self.estimate is None:
                 self.missed_data += 1
                 if self.missed_data > Fly.MAX_ALLOWED_MISSES:
-                    print("missed %d, stopping!" % (self.missed_data))
-                    self.stop_flying()
+                    self.search(gate, now)
                 else:
                     print("missing %d" % (self.missed_data))
-        return self.pose.display_results()
+        if not self.controller:
+            self.control(now)
+        if self.recorder:
+            t = timing.start()
+            self.recorder.add(now, frame, self.state())
+            timing.stop('record', t)
+
+    def search(self, gate, now):
+        """Turn towards the side gate was last seen on, or right if it
+           has not been, and stop flying if it is not found in
+           SEARCH_TIME seconds."""
+        with self.lock:
+            if self.search_start is None:
+                self.search_start = now
+                self.search_rotation = Fly.SEARCH_ROTATION
+                if gate.tvecs is not None and gate.tvecs[0][0] < 0:
+                    self.search_rotation = -Fly.SEARCH_ROTATION
+                print("missed %d, searching" % (self.missed_data))
+            elif now - self.search_start > Fly.SEARCH_TIME:
+                print("searched %.1f s, stopping!" % (now - self.search_start))
+                self.stop_flying()
+
+    def update_estimate(self, gate, now):
+        """Set the gate pose to fly by: the filtered or predicted pose
+           when filtering, otherwise the pose found in this frame."""
+        if self.filter:
+            if gate.found:
+                self.filter.update(now, gate.tvecs, gate.rvecs)
+            self.estimate = self.filter.predict(now)
+        elif gate.found:
+            self.estimate = (gate.tvecs, gate.rvecs)
+        else:
+            self.estimate = None
+        self.estimate_time = now
+
+    def control(self, now):
+        """Update the PIDs from the gate pose at time now and send the
+           stick command. Called once per frame or by the controller.
+
+           Every PID term is scaled by the time since the last call or
+           depends only on the change of the pose, so calling this more
+           often than once a frame leaves the loop gains alone and, with
+           the filter, flies by the pose predicted for now."""
+        with self.lock:
+            if not self.flying:
+                return
+            estimate = self.estimate
+            if self.controller:
+                if self.filter:
+                    estimate = self.filter.predict(now)
+                elif now - self.estimate_time > control.MAX_POSE_AGE:
+                    estimate = None
+            if estimate is None:
+                # Keep the integrals from jumping when the gate is back.
+                for p in self.pids():
+                    p.hold(now)
+                if self.search_start is not None:
+                    self.send(self.height_pid.output, 0.0, 0.0,
+                              self.search_rotation)
+                return
+            t = timing.start()
+            tvecs, rvecs = estimate
+            x, y, z = np.ravel(tvecs)
+            throttle = self.height_pid.compute(now, y)
+            direction = forward = rotation = 0.0
+            if not self.height_only:
+                offset = pose.gate_offset(tvecs, rvecs)
+                bearing = math.degrees(math.atan2(x, z))
+                direction = self.lateral_pid.compute(
+                    now, clip(offset, Fly.MAX_OFFSET))
+                forward = self.forward_pid.compute(
+                    now, clip(z, Fly.MAX_DISTANCE))
+                rotation = self.yaw_pid.compute(
+                    now, clip(bearing, Fly.MAX_BEARING))
+                # Slow down while turning to the gate so it is not lost
+                # out of the side of the view close up.
+                turn = abs(clip(bearing, Fly.MAX_BEARING))/Fly.MAX_BEARING
+                forward *= 1.0 - turn
+            timing.stop('pid', t)
+            self.send(throttle, direction, forward, rotation)
+
+    def send(self, throttle, direction, forward, rotation):
+        """Send stick command and remember it."""
+        t = timing.start()
+        self.cmd.command(throttle, direction, forward, rotation)
+        timing.stop('command', t)
+        self.last_command = (throttle, direction, forward, rotation)
+
+    def state(self):
+        """Return flight state in the order of recorder.STATE_COLUMNS."""
+        p = self.pose
+        tvecs = p.tvecs.ravel() if p.found else (np.nan,)*3
+        rvecs = p.rvecs.ravel() if p.found else (np.nan,)*3
+        pids = []
+        for axis_pid in self.pids():
+            pids += [axis_pid.set_point, axis_pid.output]
+        return ((self.course.index, p.expected_id, p.found) +
+                tuple(tvecs) + tuple(rvecs) + (p.runtime, self.flying) +
+                tuple(pids) + self.last_command)
+
+    def pids(self):
+        """Return the height, lateral, forward and yaw PIDs."""
+        return (self.height_pid, self.lateral_pid, self.forward_pid,
+                self.yaw_pid)
 
     def bind(self):
         """Bind to quadcopter"""
-        self.cmd.bind()
-        self.armed = False
+        with self.lock:
+            self.cmd.bind()
+            self.armed = False
 
     def arm(self):
         """Arm quadcopter for flight"""
-        self.cmd.arm()
-        self.armed = True
+        with self.lock:
+            self.cmd.arm()
+            self.armed = True
 
     def start_flying(self):
         """Start flying the quadcopter"""
-        if not self.armed:
-            print("Must be armed first to fly")
-        else:
-            self.flying = True
-            self.missed_data = 0
-            self.height_pid.set_set_point(0.0)
-            self.height_pid.prep_for_start(self.now(), 0.0)
+        with self.lock:
+            if not self.armed:
+                print("Must be armed first to fly")
+            else:
+                self.flying = True
+                self.missed_data = 0
+                self.search_start = None
+                now = self.now()
+                self.height_pid.set_set_point(0.0)
+                self.lateral_pid.set_set_point(0.0)
+                self.forward_pid.set_set_point(-Fly.FORWARD_PAST)
+                self.yaw_pid.set_set_point(0.0)
+                for p in self.pids():
+                    p.prep_for_start(now, 0.0)
 
     def stop_flying(self):
         """Disarm and stop quadcopter"""
-        self.flying = False
-        self.cmd.disarm()
-        self.armed = False
+        with self.lock:
+            self.flying = False
+            self.cmd.disarm()
+            self.armed = False
+
+    def close(self):
+        """Finish talking to the transmitter."""
+        if self.controller:
+            self.controller.stop()
+            print(self.controller.stats())
+        if self.telemetry:
+            self.telemetry.stop()
+        if self.recorder:
+            self.recorder.stop()
+            print(self.recorder.stats())
+        self.cmd.close()
 
     def command(self, ch, frame):
         """Process flying character commands and return True."""
@@ -112,17 +406,14 @@ class Fly:
             self.start_flying()
             return True
         if ch == ord('c'):
-            name = "raw_image_%d.png" % image_count
-            if cv2.imwrite(name, frame):
-                print("Captured input %s" % name)
-            else:
-                print("Error writing %s" % name)
-            name = "detect_image_%d.png" % image_count
-            if cv2.imwrite(name, results):
-                print("Captured detection %s" % name)
-            else:
-                print("Error writing %s" % name)
-            image_count += 1
+            # Written by the recorder's thread when there is one.
+            write = recorder.write_image
+            if self.recorder:
+                write = self.recorder.snapshot
+            write("raw_image_%d.png" % self.image_count, frame)
+            write("detect_image_%d.png" % self.image_count,
+                  self.pose.display_results())
+            self.image_count += 1
             return True
         return False
 
@@ -133,3 +424,25 @@ class Fly:
         print('d, s -- disarm and stop flying\n')
         print('f    -- fly!\n')
         print('c    -- capture images\n')
+
+
+def clip(value, limit):
+    """Return value limited to between -limit and limit."""
+    return max(-limit, min(limit, value))
+
+
+def make_pid(forward, out_min, out_max, kp, ki):
+    """Return PID.PID proportional on measurement with a small integral,
+       starting at zero output.
+
+       Started from an input of zero, pid.PID's proportional on
+       measurement term adds up to kp times the input while the output
+       is inside its limits, falling as the input rises when forward
+       acting and rising when reverse acting. The integral moves the
+       same way by ki times the input's distance past the set point
+       each second."""
+    p = pid.PID(forward)
+    p.set_output_limits(out_min, out_max)
+    p.set_initial_output(0.0)
+    p.set_tunings(kp, ki, 0.0, False)
+    return p
@@ -6,6 +6,10 @@ You can use this to verify that that data path from the drone, through
 the FPV Video Receiver and all the way into the NVIDIA Nano works. It
 also verifies that Python and OpenCV are set up correctly.
 
+With '--record' the frames are also written, with their times, into a
+session directory that live.py and this program can replay through
+'--video'.
+
 """
 
 __author__ = "Steve Geyer"
@@ -16,7 +20,9 @@ __version__ = "1.0.0"
 __status__ = "Development"
 
 import argparse
+import sys
 import cv2
+import source
 
 def interactive_help():
     """Print interactive help"""
@@ -34,13 +40,41 @@ def process_command():
 
 def main():
     """Execute the command"""
-    cap = cv2.VideoCapture(0)
+    parser = argparse.ArgumentParser(description='Show the drone camera')
+    parser.add_argument('-v', '--video',
+                        help='camera number, video file, image directory '
+                        'or recorded session to read',
+                        required=False, default='0')
+    parser.add_argument('--replay',
+                        help='replay recordings on their own schedule or '
+                        'as fast as possible',
+                        required=False, choices=source.MODES,
+                        default=source.REALTIME)
+    parser.add_argument('--record',
+                        help='session directory to record frames into',
+                        required=False)
+    args = parser.parse_args()
+    try:
+        cap = source.open_source(args.video, args.replay)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    writer = None
+    if args.record:
+        writer = source.SessionWriter(args.record)
     while True:
-        _, frame = cap.read()
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if writer:
+            writer.add(frame, cap.timestamp)
         cv2.imshow('frame', frame)
         if not process_command():
             break
     cap.release()
+    if writer:
+        writer.close()
+        print("recorded %d frames" % writer.count)
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
@@ -12,8 +12,17 @@ Type 'f' to start flying.
 
 Type 's' to start flying.
 
+Type 'l' to print the latency histograms collected with '--timing'.
+
 Type 'q' to quit the program.
 
+Capture, pose processing and display run as separate stages so a slow
+display never delays the next command. With '--display-rate 0' there is
+no window and commands are typed into the console instead. A video
+file, image directory or recorded session given with '--video' stands
+in for the camera, replayed in real time or with '--replay fast' as
+fast as frames can be processed.
+
 """
 
 __author__ = "Steve Geyer"
@@ -24,42 +33,100 @@ __version__ = "1.0.0"
 __status__ = "Development"
 
 import argparse
+import sys
+import threading
+import time
 import cv2
 import fly
+import pipeline
+import source
+import timing
 
 def interactive_help(f):
     """Print interactive help"""
     f.command_help()
+    print('l    -- print latency histograms')
     print('q    -- quit program')
     print('h, ? -- this help')
 
-def process_command(f, frame):
-    """Get character and process command. Return True to stop running."""
-    ch = cv2.waitKey(1) & 0xFF
-    if f.command(ch, frame):
-        return True
+def process_command(p, f, ch):
+    """Process command character. Return False to stop running."""
     if ch == ord('h') or ch == ord('?'):
         interactive_help(f)
+    elif ch == ord('l'):
+        timing.report()
     elif ch == ord('q'):
         return False
+    elif ch != 0xFF:
+        p.key(ch)
     return True
 
+def display(p, f, rate):
+    """Show results at rate per second and take commands from the window."""
+    period_ms = max(1, int(1000/rate))
+    while p.running:
+        result = p.take_result()
+        if result is not None:
+            t = time.monotonic()
+            cv2.imshow('frame', result)
+            p.timers['display'].add((time.monotonic() - t)*1000)
+        if not process_command(p, f, cv2.waitKey(period_ms) & 0xFF):
+            break
+
+def console(p, f):
+    """Take commands from the console when there is no display."""
+    def read():
+        for line in sys.stdin:
+            for ch in line.strip():
+                if not process_command(p, f, ord(ch)):
+                    p.running = False
+                    return
+    threading.Thread(target=read, daemon=True).start()
+    while p.running:
+        time.sleep(0.1)
+
 def main():
     """Execute the command"""
     parser = argparse.ArgumentParser(description='Run quadcopter in live mode')
+    parser.add_argument('-v', '--video',
+                        help='camera number, video file, image directory '
+                        'or recorded session to read',
+                        required=False, default='0')
+    parser.add_argument('--replay',
+                        help='replay recordings on their own schedule or '
+                        'as fast as possible',
+                        required=False, choices=source.MODES,
+                        default=source.REALTIME)
+    parser.add_argument('-r', '--display-rate',
+                        help='display updates per second, 0 for no display',
+                        required=False, type=float, default=10.0)
+    parser.add_argument('--timing',
+                        help='record per-stage latency histograms',
+                        required=False, action='store_true')
     f = fly.Fly(parser)
     args = parser.parse_args()
+    timing.enable(args.timing)
+    try:
+        cap = source.open_source(args.video, args.replay)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
     f.setup(args)
-    cap = cv2.VideoCapture(0)
-    while True:
-        _, frame = cap.read()
-        results = f.process(frame)
-        cv2.imshow('frame', results)
-        if not process_command(f, frame):
-            break
-    f.stop_flying()
+    p = pipeline.Pipeline(f, cap, args.replay == source.FAST)
+    p.start()
+    if args.display_rate > 0:
+        display(p, f, args.display_rate)
+    else:
+        console(p, f)
+    f.stop_flying()     # Before p.stop(), which may wait on the camera.
+    p.stop()
+    f.close()
     cap.release()
-    cv2.destroyAllWindows()
+    if args.display_rate > 0:
+        cv2.destroyAllWindows()
+    p.report()
+    if args.timing:
+        timing.report()
 
 if __name__ == "__main__":
     main()
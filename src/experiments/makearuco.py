@@ -2,7 +2,8 @@
 
 """Create an Aruco markers for testing.
 
-It can create a single marker or a pair for easy testing.
+It can create a single marker or a pair for easy testing. Markers come
+from the same dictionaries pose.Pose detects (see '--dictionary').
 """
 
 __author__ = "Steve Geyer"
@@ -17,12 +18,12 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import cv2
 from cv2 import aruco
+import pose
 
 
 def main():
     """Execute the command"""
 
-    aruco_dict = aruco.Dictionary_get(aruco.DICT_6X6_250)
     fig = plt.figure()
 
     parser = argparse.ArgumentParser(description='Create aruco fiducial markers')
@@ -33,8 +34,18 @@ def main():
                         required=False, default=1)
     parser.add_argument('-p', '--pair', help='create a pair of markers',
                         required=False, action='store_true')
+    parser.add_argument('-d', '--dictionary',
+                        help='Aruco dictionary: %s or a number N for the '
+                        'first N markers of 6x6_250' %
+                        ', '.join(pose.DICTIONARIES),
+                        required=False, default=pose.DEFAULT_DICTIONARY)
     args = parser.parse_args()
 
+    aruco_dict = pose.make_dictionary(args.dictionary)
+    if not 0 <= args.id < len(aruco_dict.bytesList):
+        print('ID %d is not in dictionary %s' % (args.id, args.dictionary))
+        return
+
     if not args.pair:
         img = aruco.drawMarker(aruco_dict, args.id, 700)
         filename = args.basename + '.png'
@@ -22,8 +22,12 @@ def main():
     parser.add_argument('-f', '--filename',
                         help='source image',
                         required=False, default='images/raw_image_0.png')
+    parser.add_argument('--calibration',
+                        help='camera calibration file',
+                        required=False, default=pose.CALIBRATION_FILE)
     args = parser.parse_args()
 
+    pose.set_calibration(args.calibration)
     p = pose.Pose()
     frame = cv2.imread(args.filename)
     p.solve(frame, args.id)
@@ -70,6 +70,11 @@ class PID:
         self.last_input = input_value
         self.init_input = input_value
 
+    def hold(self, now):
+        """Skip the time to now without computing, as while there is no
+           input, so the next compute() does not integrate over it."""
+        self.last_time = now
+
     def compute(self, now, input_value):
         """Take time (in seconds) and current input value, update PID
            and return new control signal."""
@@ -99,9 +104,11 @@ class PID:
         if not self.p_on_e:
             self.output -= kp * d_input
 
-	# Factor in proportional-on-error.
+	# Factor in proportional-on-error. It adds to the output on every
+	# call, so it is scaled by the time change like the integral to
+	# behave the same at any update rate.
         if self.p_on_e:
-            self.output -= kp * input_error
+            self.output -= kp * input_error * time_change
 
 	# Factor in derivative.
         self.output -= kd * d_input
@@ -0,0 +1,180 @@
+"""Run capture, pose/control and display as separate pipeline stages.
+
+The capture thread always keeps only the newest frame so the driver
+never queues up stale video. The worker thread runs the flying code on
+the newest frame it finds and drops any it missed. The display runs in
+the calling thread at its own, lower, rate and can be turned off.
+Commands go to the worker with the next frame, except stop and disarm
+which are applied straight away.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import queue
+import threading
+import time
+import timing
+
+# Command characters that stop flying, applied without waiting a frame.
+STOP_KEYS = (ord('d'), ord('s'))
+
+class StageTimer:
+    """Running timing statistics, in milliseconds, for one stage."""
+
+    def __init__(self, name):
+        """Initialize timer with stage name."""
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        """Add one measurement, also to the timing histograms if on."""
+        if timing.enabled:
+            timing.add(self.name, ms)
+        self.count += 1
+        self.total += ms
+        self.last = ms
+        self.max = max(self.max, ms)
+
+    def average(self):
+        """Return average measurement."""
+        if self.count == 0:
+            return 0.0
+        return self.total/self.count
+
+    def __str__(self):
+        return "%-10s n:%6d avg:%7.2f max:%7.2f last:%7.2f ms" % (
+            self.name, self.count, self.average(), self.max, self.last)
+
+
+class Pipeline:
+    """Capture, fly and display pipeline with latest-frame-wins handoff."""
+
+    def __init__(self, f, cap, lossless=False):
+        """Initialize pipeline for fly.Fly f reading frames from cap, a
+           cv2.VideoCapture or a source.py source.
+
+           When lossless is True the capture waits for the worker to
+           take each frame instead of replacing it, which is how a
+           recording is replayed as fast as possible."""
+        self.fly = f
+        self.cap = cap
+        self.lossless = lossless
+        self.running = False
+        self.threads = []
+        self.keys = queue.Queue()
+
+        # Newest frame handed from capture to the worker.
+        self.cond = threading.Condition()
+        self.frame = None
+        self.frame_time = 0.0
+        self.frame_count = 0
+        self.processed = 0      # Frame count the worker last processed.
+        self.dropped = 0        # Frames replaced before being processed.
+
+        # Newest result image handed from the worker to the display.
+        self.want_result = threading.Event()
+        self.result = None
+
+        self.timers = {name: StageTimer(name)
+                       for name in ('capture', 'process', 'render',
+                                    'display', 'latency')}
+
+    def start(self):
+        """Start the capture and worker threads."""
+        self.running = True
+        self.threads = [threading.Thread(target=self.run_capture, daemon=True),
+                        threading.Thread(target=self.run_worker, daemon=True)]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        """Stop the threads and wait for them to finish."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join()
+
+    def key(self, ch):
+        """Queue a command character for the worker. Stop and disarm
+           are applied at once instead, since the worker only takes
+           commands when the next frame arrives and that may never
+           happen. Fly guards them with its lock."""
+        if ch in STOP_KEYS:
+            self.fly.command(ch, None)
+        else:
+            self.keys.put(ch)
+
+    def take_result(self):
+        """Return the newest result image, if any, and ask for another."""
+        result = self.result
+        self.result = None
+        self.want_result.set()
+        return result
+
+    def run_capture(self):
+        """Read frames as they arrive, keeping only the newest."""
+        while self.running:
+            t = time.monotonic()
+            ok, frame = self.cap.read()
+            now = time.monotonic()
+            if not ok:
+                break
+            self.timers['capture'].add((now - t)*1000)
+            with self.cond:
+                while (self.lossless and self.running and
+                       self.frame_count != self.processed):
+                    self.cond.wait()
+                if self.frame_count != self.processed:
+                    self.dropped += 1
+                self.frame = frame
+                self.frame_time = now
+                self.frame_count += 1
+                self.cond.notify_all()
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def run_worker(self):
+        """Fly using the newest frame."""
+        while True:
+            with self.cond:
+                while self.running and self.frame_count == self.processed:
+                    self.cond.wait()
+                if self.frame_count == self.processed:
+                    break
+                frame = self.frame
+                frame_time = self.frame_time
+                self.processed = self.frame_count
+                self.cond.notify_all()
+
+            while not self.keys.empty():
+                self.fly.command(self.keys.get(), frame)
+
+            t = time.monotonic()
+            self.fly.update(frame)
+            now = time.monotonic()
+            self.timers['process'].add((now - t)*1000)
+            self.timers['latency'].add((now - frame_time)*1000)
+
+            if self.want_result.is_set():
+                self.want_result.clear()
+                t = time.monotonic()
+                self.result = self.fly.pose.display_results()
+                self.timers['render'].add((time.monotonic() - t)*1000)
+
+    def report(self):
+        """Print the per-stage timing."""
+        for timer in self.timers.values():
+            print(timer)
+        dropped = self.dropped + getattr(self.cap, 'dropped', 0)
+        print("frames:%d processed:%d dropped:%d" % (
+            self.frame_count, self.timers['process'].count, dropped))
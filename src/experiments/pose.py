@@ -8,48 +8,276 @@ __version__ = "1.0.0"
 __status__ = "Development"
 
 import math
+import os
+import threading
 import numpy as np
 import cv2
 from cv2 import aruco
+import timing
+
+# Ways of undistorting. UNDISTORT_IMAGE remaps the whole gray image
+# before detection. UNDISTORT_CORNERS detects on the raw distorted
+# gray image and only undistorts the corners handed to solvePnP.
+UNDISTORT_IMAGE = 'image'
+UNDISTORT_CORNERS = 'corners'
+UNDISTORT_MODES = (UNDISTORT_IMAGE, UNDISTORT_CORNERS)
+
+# Camera calibration read by default, found next to this file so tools
+# can run from any directory, and the image size it is for.
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'calibration.npz')
+CALIBRATION_SIZE = (640, 480)
+
+# Named Aruco detector settings, each a set of DetectorParameters
+# attributes changed from OpenCV's defaults. 'fast' thresholds with two
+# windows instead of three and skips small candidates. (A single window,
+# min equal to max, finds no markers at all with OpenCV 4.5.) 'robust'
+# thresholds with six windows, accepts smaller and more skewed markers
+# and refines the corners to sub-pixel accuracy. 'balanced' is OpenCV's
+# defaults.
+DETECTOR_PROFILES = {
+    'fast': {
+        'adaptiveThreshWinSizeMin': 13,
+        'adaptiveThreshWinSizeMax': 23,
+        'minMarkerPerimeterRate': 0.06,
+    },
+    'balanced': {},
+    'robust': {
+        'adaptiveThreshWinSizeMin': 3,
+        'adaptiveThreshWinSizeMax': 33,
+        'adaptiveThreshWinSizeStep': 6,
+        'minMarkerPerimeterRate': 0.02,
+        'polygonalApproxAccuracyRate': 0.05,
+        'cornerRefinementMethod': aruco.CORNER_REFINE_SUBPIX,
+    },
+}
+DEFAULT_PROFILE = 'balanced'
+
+# Aruco dictionaries by name. The smaller 6x6 dictionaries are the first
+# markers of DICT_6X6_250, so a marker printed from any of them is the
+# same. Identification compares each candidate against every marker of
+# the dictionary, so a smaller one is faster and matches less noise.
+DICTIONARIES = {
+    '6x6_50': aruco.DICT_6X6_50,
+    '6x6_100': aruco.DICT_6X6_100,
+    '6x6_250': aruco.DICT_6X6_250,
+}
+DEFAULT_DICTIONARY = '6x6_250'
+
+def make_dictionary(name):
+    """Return the Aruco dictionary called name, a key of DICTIONARIES or
+       a number N for the first N markers of DICT_6X6_250 (IDs 0 to
+       N - 1)."""
+    if name in DICTIONARIES:
+        return aruco.Dictionary_get(DICTIONARIES[name])
+    d = aruco.Dictionary_get(aruco.DICT_6X6_250)
+    count = int(name)
+    if not 0 < count <= len(d.bytesList):
+        raise ValueError("dictionary size %d out of range" % count)
+    d.bytesList = d.bytesList[:count].copy()
+    return d
+
+def course_dictionary(marker_ids):
+    """Return the name of the smallest dictionary holding marker_ids."""
+    return str(max(marker_ids) + 1)
+
+class Context:
+    """Camera calibration, undistort maps and Aruco detector shared by
+    all poses.
+
+    Nothing is loaded or built until it is first used, so importing
+    pose is cheap. warmup() does all of it up front, before flying,
+    so the first frame does not pay for it.
+    """
+
+    def __init__(self, calibration=CALIBRATION_FILE,
+                 profile=DEFAULT_PROFILE, dictionary=DEFAULT_DICTIONARY):
+        """Initialize context for the calibration file, the named
+           detector profile of DETECTOR_PROFILES and the dictionary
+           named as for make_dictionary()."""
+        self.calibration = calibration
+        self.profile = profile
+        self.dictionary = dictionary
+        self.lock = threading.Lock()
+        self._camera_matrix = None
+        self._dist_coeffs = None
+        self._aruco_dict = None
+        self._aruco_params = None
+        # Undistortion maps keyed by frame size. Building the maps is
+        # the expensive part of undistorting so we only do it once per
+        # resolution.
+        self.undistort_cache = {}
+
+    @property
+    def camera_matrix(self):
+        """Return the calibrated camera matrix."""
+        if self._camera_matrix is None:
+            self.load()
+        return self._camera_matrix
+
+    @property
+    def dist_coeffs(self):
+        """Return the calibrated distortion coefficients."""
+        if self._dist_coeffs is None:
+            self.load()
+        return self._dist_coeffs
+
+    @property
+    def aruco_dict(self):
+        """Return the Aruco dictionary of the gate markers."""
+        if self._aruco_dict is None:
+            self._aruco_dict = make_dictionary(self.dictionary)
+        return self._aruco_dict
+
+    def set_dictionary(self, dictionary):
+        """Detect markers of the dictionary named as for
+           make_dictionary()."""
+        self._aruco_dict = make_dictionary(dictionary)
+        self.dictionary = dictionary
+
+    @property
+    def aruco_params(self):
+        """Return the Aruco detector parameters."""
+        if self._aruco_params is None:
+            params = aruco.DetectorParameters_create()
+            for name, value in DETECTOR_PROFILES[self.profile].items():
+                setattr(params, name, value)
+            self._aruco_params = params
+        return self._aruco_params
+
+    def set_profile(self, profile):
+        """Detect with the named profile of DETECTOR_PROFILES."""
+        if profile not in DETECTOR_PROFILES:
+            raise ValueError("unknown detector profile %r" % profile)
+        self.profile = profile
+        self._aruco_params = None
+
+    def load(self):
+        """Read the calibration file."""
+        with self.lock:
+            if self._camera_matrix is None:
+                with np.load(self.calibration) as x:
+                    self._dist_coeffs = x['distCoeffs']
+                    self._camera_matrix = x['cameraMatrix']
+
+    def sized_camera_matrix(self, w, h):
+        """Return the camera matrix of a w x h frame, the calibrated one
+           scaled from CALIBRATION_SIZE."""
+        k = self.camera_matrix.copy()
+        k[0] *= w/CALIBRATION_SIZE[0]
+        k[1] *= h/CALIBRATION_SIZE[1]
+        return k
+
+    def undistort_maps(self, w, h):
+        """Return cached (map1, map2, new_matrix) for undistorting a
+           w x h frame. The maps are fixed-point (CV_16SC2) for a fast
+           remap."""
+        maps = self.undistort_cache.get((w, h))
+        if maps is None:
+            k = self.sized_camera_matrix(w, h)
+            new_matrix, _ = cv2.getOptimalNewCameraMatrix(
+                k, self.dist_coeffs, (w, h), 1, (w, h))
+            map1, map2 = cv2.initUndistortRectifyMap(
+                k, self.dist_coeffs, None, new_matrix, (w, h), cv2.CV_16SC2)
+            maps = (map1, map2, new_matrix)
+            self.undistort_cache[(w, h)] = maps
+        return maps
+
+    def warmup(self, size=CALIBRATION_SIZE):
+        """Load everything and build the undistort maps for frames of
+           size (w, h), then run the detector once on a blank frame.
+           Return the seconds taken."""
+        start = cv2.getTickCount()
+        w, h = size
+        self.undistort_maps(w, h)
+        aruco.detectMarkers(np.zeros((h, w), np.uint8), self.aruco_dict,
+                            parameters=self.aruco_params,
+                            cameraMatrix=self.camera_matrix)
+        return (cv2.getTickCount() - start)/cv2.getTickFrequency()
+
+
+_context = None     # Context in use, made by context() on first use.
+
+def context():
+    """Return the shared Context, creating it on first use."""
+    global _context
+    if _context is None:
+        _context = Context()
+    return _context
+
+def set_calibration(calibration):
+    """Use the calibration file from now on."""
+    global _context
+    if _context is None:
+        _context = Context(calibration)
+    elif _context.calibration != calibration:
+        _context = Context(calibration, _context.profile,
+                           _context.dictionary)
+
+def set_profile(profile):
+    """Detect with the named profile of DETECTOR_PROFILES from now on."""
+    context().set_profile(profile)
+
+def set_dictionary(dictionary):
+    """Detect markers of the dictionary named as for make_dictionary()
+       from now on."""
+    context().set_dictionary(dictionary)
+
+def make_target_objp(target_size, target_dist):
+    """Return the 3D points around a gate's pair of markers.
+
+    We start at the upper left hand point of the left hand marker and
+    go clockwise. Then we do the upper left hand point of the right
+    marker and go clockwise. Everthing is positioned relative to the
+    center of the gate we want to transition through."""
+    max_dx = (target_size + target_dist)/2
+    min_dx = max_dx - target_size
+    dy = target_size/2
+    return np.array([[-max_dx, -dy, 0],
+                     [-min_dx, -dy, 0],
+                     [-min_dx, dy, 0],
+                     [-max_dx, dy, 0],
+                     [min_dx, -dy, 0],
+                     [max_dx, -dy, 0],
+                     [max_dx, dy, 0],
+                     [min_dx, dy, 0]], np.float32)
 
 class Pose:
     """Determine quadcopter's pose using a pair of Aruco fiducial makers."""
 
-    # Set up aruco markers as class variables.
-    aruco_dict = aruco.Dictionary_get(aruco.DICT_6X6_250)
-    aruco_params = aruco.DetectorParameters_create()
-
     # Aruco target parameters.
     target_size = 12.3     # Aruco target size in cm.
     target_dist = 32.2     # Distance between center of targets in cm.
 
-    # 'target_objp' defined the points around the two markers. We
-    # start at the upper left hand point of the left hand marker and
-    # go clockwise. Then we do the upper left hand point of the right
-    # marker and go clockwise. Everthing is positioned relative to the
-    # center of the gate we want to transition through.
-    max_dx = (target_size + target_dist)/2
-    min_dx = max_dx - target_size
-    dy = target_size/2
-    target_objp = np.array([[-max_dx, -dy, 0],
-                            [-min_dx, -dy, 0],
-                            [-min_dx, dy, 0],
-                            [-max_dx, dy, 0],
-                            [min_dx, -dy, 0],
-                            [max_dx, -dy, 0],
-                            [max_dx, dy, 0],
-                            [min_dx, dy, 0]], np.float32)
-
-    # Set up camera calibration data as class variables.
-    with np.load('calibration.npz') as x:
-        camera_matrix = x['cameraMatrix']
-        dist_coeffs = x['distCoeffs']
-
-
-    def __init__(self):
+    # 'target_objp' defined the points around the two markers.
+    target_objp = make_target_objp(target_size, target_dist)
+
+    # Tracking parameters. When tracking, the search is limited to the
+    # bounding box around the last markers grown by TRACK_PAD of its
+    # size on every side. A full frame search is forced after a miss
+    # and at least every TRACK_FULL_EVERY frames.
+    TRACK_PAD = 0.5
+    TRACK_FULL_EVERY = 15
+
+    # Pyramid parameters. When using the pyramid, detection runs on the
+    # smallest pyramid level (up to PYRAMID_MAX_LEVEL) where the last
+    # markers' shortest side is still at least PYRAMID_MIN_SIDE pixels.
+    PYRAMID_MAX_LEVEL = 2
+    PYRAMID_MIN_SIDE = 32
+
+    def __init__(self, undistort=UNDISTORT_IMAGE, track=False, pyramid=False):
         """Initialize pose with image"""
+        self.undistort = undistort  # One of UNDISTORT_MODES.
+        self.track = track      # True to search around the last markers.
+        self.tracked = 0        # Frames found by tracking since full search.
+        self.roi = None         # (x, y, w, h) searched or None if full frame.
+        self.detected = None    # Corners in detection image coordinates.
+        self.pyramid = pyramid  # True to detect on a downscaled image.
+        self.level = 0          # Pyramid level for the next detection.
         self.frame = None       # Input image frame.
-        self.gray = None        # Undisorted gray scale image to process.
+        self.gray = None        # Gray scale image to process.
+        self.expected_id = None # Marker ID of the gate being solved.
+        self.markers = {}       # Corners of all detected markers by ID.
         self.corners = None     # Corners of detected fiducial markers.
         self.ids = None         # IDs of detected fiducial markers.
         self.rvecs = None       # Rotation vector of detected markers.
@@ -59,30 +287,108 @@ class Pose:
         self.status = None      # Status information.
 
 
-    def solve(self, frame, expected_id):
-        """Solve for quadcopter pose"""
+    def solve(self, frame, expected_id, guess=None):
+        """Solve for quadcopter pose, starting from the (tvecs, rvecs)
+           guess if given."""
         e1 = cv2.getTickCount()
         self.frame = frame
-        self.gray = create_gray_frame(frame)
-        self.corners, self.ids = detect_markers(self.gray, expected_id)
-        if self.corners is not None and len(self.corners) == 2:
-            self.found, self.rvecs, self.tvecs = position_markers(self.corners)
+        self.expected_id = expected_id
+        if self.undistort == UNDISTORT_CORNERS:
+            t = timing.start()
+            self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            timing.stop('gray', t)
+            t = timing.start()
+            markers = self.detect(self.gray, expected_id)
+            timing.stop('detect', t)
+            t = timing.start()
+            h, w = self.gray.shape[:2]
+            self.markers = {i: undistort_corners(c, w, h)
+                            for i, c in markers.items()}
+            timing.stop('undistort', t)
+        else:
+            t = timing.start()
+            self.gray = create_gray_frame(frame)
+            timing.stop('undistort', t)
+            t = timing.start()
+            markers = self.detect(self.gray, expected_id)
+            timing.stop('detect', t)
+            self.markers = markers
+        self.detected = markers.get(expected_id, [])
+        self.corners = self.markers.get(expected_id, [])
+        self.ids = np.full((len(self.corners), 1), expected_id, np.int32)
+        if len(self.corners) == 2:
+            t = timing.start()
+            h, w = self.gray.shape[:2]
+            self.found, self.rvecs, self.tvecs = position_markers(
+                self.corners, guess=guess, size=(w, h))
+            timing.stop('pnp', t)
         else:
             self.found = False
             self.rvecs = None
             self.tvecs = None
+        self.choose_level()
         self.runtime = (cv2.getTickCount() - e1)/cv2.getTickFrequency()*1000
         return self.found
 
 
+    def detect(self, gray, expected_id):
+        """Detect markers and return their corners by ID, first looking
+           near the last expected ones if tracking."""
+        self.roi = None
+        if (self.track and self.found and
+                self.tracked < Pose.TRACK_FULL_EVERY):
+            self.roi = tracking_roi(self.detected, gray.shape, Pose.TRACK_PAD)
+            x, y, w, h = self.roi
+            markers = detect_all_markers(gray[y:y+h, x:x+w], self.level)
+            if len(markers.get(expected_id, [])) == 2:
+                self.tracked += 1
+                return {i: offset_corners(c, x, y) for i, c in markers.items()}
+            self.roi = None
+
+        # Missed or due for a full search.
+        self.tracked = 0
+        markers = detect_all_markers(gray, self.level)
+        if self.level > 0 and len(markers.get(expected_id, [])) != 2:
+            # The markers may have become too small for the level.
+            self.level = 0
+            markers = detect_all_markers(gray)
+        return markers
+
+
+    def choose_level(self):
+        """Pick the pyramid level for the next frame from the size of
+           the markers just found."""
+        self.level = 0
+        if not self.pyramid or not self.found:
+            return
+        side = marker_side(self.detected)
+        while (self.level < Pose.PYRAMID_MAX_LEVEL and
+               side/2**(self.level+1) >= Pose.PYRAMID_MIN_SIDE):
+            self.level += 1
+
+
     def display_results(self):
         """Create image and display results on it"""
-        result = cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR)
-        if self.corners is None:
+        gray = self.gray
+        if self.undistort == UNDISTORT_CORNERS:
+            # Corners are in undistorted coordinates so draw on an
+            # undistorted image. Only the display pays for the remap.
+            gray = create_gray_frame(self.frame)
+        result = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            cv2.rectangle(result, (x, y), (x+w-1, y+h-1), (128, 128, 128), 1)
+        if not self.markers:
             return result
 
         # Draw the fiduals found.
-        result = aruco.drawDetectedMarkers(result, self.corners, self.ids)
+        corners = []
+        ids = []
+        for marker_id, c in self.markers.items():
+            corners.extend(c)
+            ids.extend([marker_id]*len(c))
+        result = aruco.drawDetectedMarkers(result, corners,
+                                           np.array(ids).reshape(-1, 1))
 
         if self.found:
             seglen = 8
@@ -92,8 +398,11 @@ class Pose:
                 [0, seglen, 0],  # Y axis
                 [0, 0, -seglen]  # Z axis
             ]).reshape(-1, 3)
+            # The result image is undistorted.
+            h, w = gray.shape[:2]
+            _, _, new_matrix = undistort_maps(w, h)
             imgpts, _ = cv2.projectPoints(axis, self.rvecs, self.tvecs,
-                                          Pose.camera_matrix, Pose.dist_coeffs)
+                                          new_matrix, None)
             result = draw_axis(result, imgpts)
             self.add_status(result)
         return result
@@ -130,41 +439,113 @@ class Pose:
                     color, lineType=cv2.LINE_AA)
 
 
+def undistort_maps(w, h):
+    """Return cached (map1, map2, new_matrix) for undistorting a w x h
+       frame with the shared context."""
+    return context().undistort_maps(w, h)
+
+
 def create_gray_frame(frame):
     """Create and return an undistorted grayscale image"""
-    h, w = frame.shape[:2]
-    new_matrix, _ = cv2.getOptimalNewCameraMatrix(Pose.camera_matrix,
-                                                  Pose.dist_coeffs,
-                                                  (w, h), 1, (w, h))
-    fixed = cv2.undistort(frame, Pose.camera_matrix, Pose.dist_coeffs,
-                          None, new_matrix)
-    return cv2.cvtColor(fixed, cv2.COLOR_BGR2GRAY)
+    # Convert first so the remap only moves one channel.
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    map1, map2, _ = undistort_maps(w, h)
+    return cv2.remap(gray, map1, map2, cv2.INTER_LINEAR)
+
+
+def undistort_corners(corners, w, h):
+    """Map corners found in a distorted w x h frame into the same
+       undistorted image coordinates create_gray_frame() produces."""
+    ctx = context()
+    _, _, new_matrix = ctx.undistort_maps(w, h)
+    k = ctx.sized_camera_matrix(w, h)
+    fixed = []
+    for c in corners:
+        pts = cv2.undistortPoints(np.asarray(c, np.float32).reshape(-1, 1, 2),
+                                  k, ctx.dist_coeffs, P=new_matrix)
+        fixed.append(pts.reshape(1, -1, 2))
+    return fixed
+
 
+def detect_all_markers(gray, level=0):
+    """Detect markers and return a dictionary of their corners by ID. A
+       level above zero detects on that pyramid level of gray and then
+       refines the corners on gray itself."""
+    ctx = context()
+    small = gray
+    for _ in range(level):
+        small = cv2.pyrDown(small)
+    d_corners, d_ids, _ = aruco.detectMarkers(small,
+                                              ctx.aruco_dict,
+                                              parameters=ctx.aruco_params,
+                                              cameraMatrix=ctx.camera_matrix)
+    if not d_corners:
+        return {}
+    if level > 0:
+        d_corners = refine_corners(gray, d_corners, level)
 
-def detect_markers(gray, expected_id):
+    markers = {}
+    for marker_id, corners in zip(d_ids[:, 0], d_corners):
+        markers.setdefault(int(marker_id), []).append(corners)
+    return markers
+
+
+def detect_markers(gray, expected_id, level=0):
     """Detect and return corners with the correct ID."""
-    d_corners, d_ids, _ = aruco.detectMarkers(gray,
-                                              Pose.aruco_dict,
-                                              parameters=Pose.aruco_params,
-                                              cameraMatrix=Pose.camera_matrix)
+    corners = detect_all_markers(gray, level).get(expected_id, [])
+    return corners, np.full((len(corners), 1), expected_id, np.int32)
+
+
+# Stop refining corners after this many iterations or this small a move.
+REFINE_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+def refine_corners(gray, corners, level):
+    """Scale corners found on a pyramid level up to gray and refine
+       them to sub-pixel accuracy there."""
+    scale = 2**level
+    pts = (np.concatenate(corners).reshape(-1, 2) + 0.5)*scale - 0.5
+    pts = np.ascontiguousarray(pts, np.float32)
+    win = scale + 1
+    cv2.cornerSubPix(gray, pts, (win, win), (-1, -1), REFINE_CRITERIA)
+    return [p.reshape(1, 4, 2) for p in np.split(pts, len(corners))]
+
+
+def marker_side(corners):
+    """Return the length in pixels of the shortest marker side."""
+    pts = np.concatenate([np.asarray(c).reshape(-1, 4, 2) for c in corners])
+    sides = pts - np.roll(pts, 1, axis=1)
+    return np.sqrt((sides*sides).sum(axis=2)).min()
+
 
-    # Only keep the corners from the expected IDs.
-    ids = np.array([])
-    corners = []
-    for i in range(len(d_corners)):
-        if d_ids[i][0] == expected_id:
-            np.append(ids, d_ids[i])
-            corners.append(d_corners[i])
+def tracking_roi(corners, shape, pad):
+    """Return (x, y, w, h) of the box around corners grown by pad of
+       its size on each side and clipped to an image of shape."""
+    pts = np.concatenate([np.asarray(c).reshape(-1, 2) for c in corners])
+    x0, y0 = pts.min(axis=0)
+    x1, y1 = pts.max(axis=0)
+    dx = (x1 - x0)*pad
+    dy = (y1 - y0)*pad
+    h, w = shape[:2]
+    x0 = max(0, int(x0 - dx))
+    y0 = max(0, int(y0 - dy))
+    x1 = min(w, int(math.ceil(x1 + dx)) + 1)
+    y1 = min(h, int(math.ceil(y1 + dy)) + 1)
+    return x0, y0, x1 - x0, y1 - y0
 
-    return corners, ids
+
+def offset_corners(corners, x, y):
+    """Move corners found in an ROI back into full image coordinates."""
+    offset = np.array([x, y], np.float32)
+    return [c + offset for c in corners]
 
 
 def draw_axis(img, imgpts):
     """Draw an x, y, z axis on image."""
-    corner = tuple(imgpts[0].ravel())
-    img = cv2.line(img, corner, tuple(imgpts[1].ravel()), (255, 0, 0), 3)
-    img = cv2.line(img, corner, tuple(imgpts[2].ravel()), (0, 255, 0), 3)
-    img = cv2.line(img, corner, tuple(imgpts[3].ravel()), (0, 0, 255), 3)
+    pts = [tuple(int(v) for v in p.ravel()) for p in imgpts]
+    img = cv2.line(img, pts[0], pts[1], (255, 0, 0), 3)
+    img = cv2.line(img, pts[0], pts[2], (0, 255, 0), 3)
+    img = cv2.line(img, pts[0], pts[3], (0, 0, 255), 3)
     return img
 
 
@@ -173,12 +554,45 @@ def segment_length(x, y, z):
     return math.sqrt(x*x+y*y+z*z)
 
 
-def position_markers(corners):
-    """Take 2D points and apply against 3D model of fiducial markers."""
+def gate_yaw(rvecs):
+    """Return how far in degrees the gate is turned about the camera's
+       vertical axis, positive when its right side is nearer."""
+    r, _ = cv2.Rodrigues(np.asarray(rvecs, np.float64).reshape(3, 1))
+    return math.degrees(math.atan2(-r[2, 0], r[0, 0]))
+
+
+def gate_offset(tvecs, rvecs):
+    """Return how far in cm the camera is to the right of the line
+       through the gate's center square on to it, seen from in front."""
+    r, _ = cv2.Rodrigues(np.asarray(rvecs, np.float64).reshape(3, 1))
+    return -r[:, 0].dot(np.ravel(tvecs))
+
+
+def gate_corners(corners):
+    """Return the 8 corners of a gate's pair of markers as an (8, 2)
+       array, the left hand marker's first as in make_target_objp()."""
     p1 = np.array(corners[0][0], np.float32)
     p2 = np.array(corners[1][0], np.float32)
     if p1[0][0] > p2[0][0]:
         p1, p2 = p2, p1
-    all_corners = np.concatenate((p1, p2), axis=0)
-    return cv2.solvePnP(Pose.target_objp, all_corners,
-                        Pose.camera_matrix, Pose.dist_coeffs)
+    return np.concatenate((p1, p2), axis=0)
+
+
+def position_markers(corners, objp=Pose.target_objp, guess=None,
+                     size=CALIBRATION_SIZE):
+    """Take 2D points and apply against 3D model of fiducial markers. A
+       (tvecs, rvecs) guess, such as a predicted pose, is where the
+       solver starts instead of from scratch.
+
+       The corners are in the undistorted image coordinates of a (w, h)
+       size frame, as create_gray_frame() and undistort_corners() give
+       them, so they are solved with that image's camera matrix and no
+       distortion."""
+    all_corners = gate_corners(corners)
+    _, _, new_matrix = undistort_maps(*size)
+    if guess is None:
+        return cv2.solvePnP(objp, all_corners, new_matrix, None)
+    tvecs, rvecs = guess
+    return cv2.solvePnP(objp, all_corners, new_matrix, None,
+                        np.array(rvecs, np.float64).reshape(3, 1),
+                        np.array(tvecs, np.float64).reshape(3, 1), True)
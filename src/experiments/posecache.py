@@ -0,0 +1,118 @@
+"""On-disk cache of pose solutions keyed by content.
+
+An entry is keyed by a hash of the image file's bytes together with
+everything else that decides the answer: the camera calibration, the
+marker ID looked for, the undistort mode and the Aruco dictionary and
+detector parameters. Any change to those misses the cache. Entries are
+single pose records (see poserecords.py) and the least recently used
+ones are removed once the cache grows past its size limit.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import hashlib
+import os
+import numpy as np
+import pose
+import poserecords
+
+# Bump when a change to the pose code changes its answers or to
+# poserecords.RECORD changes the entries.
+CACHE_VERSION = 4
+
+# Entries written between prunes, so a long run never grows the cache
+# far past its size limit.
+PRUNE_EVERY = 256
+
+def settings_key(p, marker_id):
+    """Return a hash of everything besides the image that decides the
+       pose of a pose.Pose."""
+    h = hashlib.sha1()
+    h.update(b'%d %d %s' % (CACHE_VERSION, marker_id, p.undistort.encode()))
+    ctx = pose.context()
+    h.update(ctx.camera_matrix.tobytes())
+    h.update(ctx.dist_coeffs.tobytes())
+    h.update(ctx.aruco_dict.bytesList.tobytes())
+    params = ctx.aruco_params
+    for name in sorted(dir(params)):
+        value = getattr(params, name)
+        if not name.startswith('_') and not callable(value):
+            h.update(('%s=%r;' % (name, value)).encode())
+    return h.hexdigest()
+
+
+class PoseCache:
+    """Cache of pose records in a directory with LRU eviction."""
+
+    def __init__(self, directory, settings, max_bytes=64*1024*1024):
+        """Initialize cache in directory for settings from settings_key()."""
+        self.directory = directory
+        self.settings = settings.encode()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, data):
+        """Return the cache key for image file bytes."""
+        h = hashlib.sha1(self.settings)
+        h.update(data)
+        return h.hexdigest()
+
+    def path(self, key):
+        """Return the file for key."""
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key, name):
+        """Return the record for key renamed to name or None."""
+        path = self.path(key)
+        try:
+            record = np.load(path)[0]
+            os.utime(path)      # Mark as recently used.
+        except (OSError, ValueError, IndexError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        record['name'] = poserecords.check_name(name)
+        return record
+
+    def put(self, key, record):
+        """Store record under key."""
+        path = self.path(key)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, np.array([record], poserecords.RECORD))
+        os.replace(tmp, path)
+
+    def prune(self):
+        """Remove least recently used entries until under max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Return text describing cache use."""
+        lookups = self.hits + self.misses
+        return "cache hits:%d misses:%d (%.0f%% hit) evictions:%d" % (
+            self.hits, self.misses, 100.0*self.hits/max(lookups, 1),
+            self.evictions)
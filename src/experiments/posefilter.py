@@ -0,0 +1,71 @@
+"""Constant velocity alpha-beta filter over a gate's pose.
+
+The state is the six numbers of a pose, the translation vector and the
+rotation vector, together with their rates of change. Each solved pose
+corrects the state; in between, and through frames where the gate was
+missed, the pose is predicted by moving on at the last velocity. After
+MAX_PREDICT seconds without a measurement the filter gives up and
+starts over from the next one.
+
+The rotation vector is filtered component by component. That is fine
+for gates seen from the front, where the rotation stays well away from
+the 180 degree wrap.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import numpy as np
+
+class PoseFilter:
+    """Alpha-beta filter predicting a pose through missed frames."""
+
+    ALPHA = 0.6         # Share of the position error corrected.
+    BETA = 0.2          # Share of the position error added to velocity.
+    MAX_PREDICT = 0.5   # Seconds to predict without a measurement.
+
+    def __init__(self, alpha=ALPHA, beta=BETA, max_predict=MAX_PREDICT):
+        """Initialize empty filter."""
+        self.alpha = alpha
+        self.beta = beta
+        self.max_predict = max_predict
+        self.x = np.zeros(6)    # tvecs then rvecs.
+        self.v = np.zeros(6)    # Their change per second.
+        self.time = None        # Time of the last measurement.
+
+    def reset(self):
+        """Forget the pose, as when moving on to another gate."""
+        self.time = None
+
+    def valid(self, now):
+        """Return True if the pose at time now can be predicted."""
+        return self.time is not None and now - self.time <= self.max_predict
+
+    def update(self, now, tvecs, rvecs):
+        """Correct the state with the pose solved at time now."""
+        z = np.concatenate([np.ravel(tvecs), np.ravel(rvecs)])
+        if not self.valid(now):
+            self.x = z
+            self.v[:] = 0
+            self.time = now
+            return
+        dt = now - self.time
+        if dt <= 0:
+            return
+        predicted = self.x + self.v*dt
+        error = z - predicted
+        self.x = predicted + self.alpha*error
+        self.v += self.beta/dt*error
+        self.time = now
+
+    def predict(self, now):
+        """Return (tvecs, rvecs) as 3x1 arrays predicted for time now or
+           None if there is no recent measurement."""
+        if not self.valid(now):
+            return None
+        x = self.x + self.v*(now - self.time)
+        return x[:3].reshape(3, 1), x[3:].reshape(3, 1)
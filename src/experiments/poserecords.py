@@ -0,0 +1,132 @@
+"""Machine readable per-frame pose records.
+
+Each solved frame becomes one record holding the translation and
+rotation vectors, whether the gate was found, the corners of the gate
+markers, left hand marker first, the IDs of every marker seen and the
+solve time. Records are gathered into a preallocated array and written
+in bulk, either appended to a CSV file a chunk at a time or saved as
+columns of an NPZ file when closed. A frame's name, its path relative
+to the directory it was read from, must fit in MAX_NAME characters.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import numpy as np
+import pose
+
+MAX_IDS = 8     # Most marker IDs kept per frame.
+MAX_NAME = 256  # Most characters in a frame's name.
+
+RECORD = np.dtype([('name', 'U%d' % MAX_NAME),  # Source of the frame.
+                   ('found', '?'),          # True if the gate was solved.
+                   ('marker_id', 'i4'),     # Gate marker ID looked for.
+                   ('tvecs', 'f8', 3),      # Translation or NaN.
+                   ('rvecs', 'f8', 3),      # Rotation or NaN.
+                   ('corners', 'f4', (8, 2)),  # Gate marker corners or NaN.
+                   ('ids', 'i4', MAX_IDS),  # All marker IDs seen, -1 padded.
+                   ('runtime', 'f8')])      # Solve time in ms.
+
+def csv_header():
+    """Return the CSV header line."""
+    names = ['name', 'found', 'marker_id',
+             'tx', 'ty', 'tz', 'rx', 'ry', 'rz']
+    names += ['c%d%s' % (i, axis) for i in range(8) for axis in 'xy']
+    names += ['id%d' % i for i in range(MAX_IDS)]
+    names.append('runtime')
+    return ','.join(names)
+
+
+def check_name(name):
+    """Return name, raising ValueError if it is too long for a record
+       rather than letting numpy cut it short."""
+    if len(name) > MAX_NAME:
+        raise ValueError('frame name longer than %d characters: %s' % (
+            MAX_NAME, name))
+    return name
+
+
+def make_record(name, p):
+    """Return a record for a solved pose.Pose."""
+    tvecs = np.full(3, np.nan)
+    rvecs = np.full(3, np.nan)
+    if p.found:
+        tvecs = p.tvecs.ravel()
+        rvecs = p.rvecs.ravel()
+    corners = np.full((8, 2), np.nan, np.float32)
+    if len(p.corners) == 2:
+        corners[:] = pose.gate_corners(p.corners)
+    ids = np.full(MAX_IDS, -1, np.int32)
+    seen = [i for i, c in sorted(p.markers.items()) for _ in c][:MAX_IDS]
+    ids[:len(seen)] = seen
+    return (check_name(name), p.found, p.expected_id, tvecs, rvecs, corners,
+            ids, p.runtime)
+
+
+class PoseRecords:
+    """Gather pose records and write them in bulk."""
+
+    def __init__(self, filename, chunk=1024):
+        """Initialize records written to filename ending in .csv or .npz."""
+        self.filename = filename
+        self.csv = filename.endswith('.csv')
+        self.buffer = np.zeros(chunk, RECORD)
+        self.used = 0
+        self.chunks = []        # Full buffers waiting for an NPZ save.
+        self.count = 0          # Records added.
+        self.file = None
+        if self.csv:
+            self.file = open(filename, 'w')
+            self.file.write(csv_header() + '\n')
+
+    def add(self, record):
+        """Add a record from make_record()."""
+        self.buffer[self.used] = record
+        self.used += 1
+        self.count += 1
+        if self.used == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Write or set aside the buffered records."""
+        records = self.buffer[:self.used]
+        if self.csv:
+            self.write_csv(records)
+        else:
+            self.chunks.append(records.copy())
+        self.used = 0
+
+    def write_csv(self, records):
+        """Append records to the CSV file in one write."""
+        numbers = np.column_stack([
+            records['found'], records['marker_id'], records['tvecs'],
+            records['rvecs'], records['corners'].reshape(-1, 16),
+            records['ids']])
+        lines = []
+        for name, row, runtime in zip(records['name'], numbers,
+                                      records['runtime']):
+            lines.append('%s,%d,%d,%s,%s,%.3f\n' % (
+                name, row[0], row[1],
+                ','.join('%.4f' % v for v in row[2:24]),
+                ','.join('%d' % v for v in row[24:]), runtime))
+        self.file.write(''.join(lines))
+
+    def close(self):
+        """Write everything out and close."""
+        self.flush()
+        if self.csv:
+            self.file.close()
+            return
+        records = np.concatenate(self.chunks)
+        np.savez(self.filename,
+                 **{name: records[name] for name in RECORD.names})
+
+
+def load(filename):
+    """Return a dictionary of record columns from an NPZ file."""
+    with np.load(filename) as data:
+        return {name: data[name] for name in data.files}
@@ -0,0 +1,133 @@
+"""Flight recorder writing frames and flight state off the control thread.
+
+The vision loop hands each frame together with a tuple of flight
+state (pose, each PID's set point and output and the latest command
+sent) to the recorder. Handing off only puts them on a bounded queue;
+a background thread does the image encoding and the writing. If the disk falls behind the recorder drops
+rather than blocks: frames are dropped once 'max_frames' of them are
+waiting and state once the queue is full, and both are counted.
+
+A recording is a session directory (see source.py) that live.py can
+replay with '--video', plus a 'state.csv' with one line of
+STATE_COLUMNS per frame. Its 'frame' column is the frame's number in
+the session or -1 if that frame was not kept.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import os
+import queue
+import threading
+import cv2
+import source
+
+STATE_NAME = 'state.csv'
+
+# Flight state recorded per frame, in the order Fly gives them.
+# Each of Fly's PIDs has a set point and output column.
+PID_AXES = ('height', 'lateral', 'forward', 'yaw')
+
+STATE_COLUMNS = (('gate', 'marker_id', 'found', 'tx', 'ty', 'tz',
+                  'rx', 'ry', 'rz', 'runtime', 'flying') +
+                 tuple('%s_%s' % (axis, column) for axis in PID_AXES
+                       for column in ('set_point', 'output')) +
+                 ('throttle', 'direction', 'forward', 'rotation'))
+
+class Recorder:
+    """Background writer of frames, flight state and snapshots."""
+
+    def __init__(self, directory, size=1024, max_frames=16, frame_every=1,
+                 ext='.jpg'):
+        """Initialize recorder writing into directory. At most size
+           entries and max_frames frames wait to be written. Only every
+           frame_every'th frame is kept."""
+        self.directory = directory
+        self.queue = queue.Queue(size)
+        self.frame_slots = threading.Semaphore(max_frames)
+        self.frame_every = frame_every
+        self.ext = ext
+        self.session = None
+        self.state_file = None
+        self.thread = None
+        self.updates = 0        # Updates handed to the recorder.
+        self.frames = 0         # Frames written.
+        self.dropped_frames = 0
+        self.dropped_states = 0
+
+    def start(self):
+        """Open the recording and start the writer."""
+        self.session = source.SessionWriter(self.directory, self.ext)
+        self.state_file = open(os.path.join(self.directory, STATE_NAME), 'w')
+        self.state_file.write(','.join(('time', 'frame') + STATE_COLUMNS)
+                              + '\n')
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Write out what is waiting and close the recording."""
+        self.queue.put(None)
+        self.thread.join()
+        self.session.close()
+        self.state_file.close()
+
+    def add(self, t, frame, state):
+        """Hand off frame, which may be None, and flight state taken at
+           time t. Never blocks."""
+        if frame is not None and self.updates % self.frame_every != 0:
+            frame = None
+        self.updates += 1
+        if frame is not None and not self.frame_slots.acquire(False):
+            self.dropped_frames += 1
+            frame = None
+        try:
+            self.queue.put_nowait((t, frame, state))
+        except queue.Full:
+            self.dropped_states += 1
+            if frame is not None:
+                self.dropped_frames += 1
+                self.frame_slots.release()
+
+    def snapshot(self, name, image):
+        """Hand off image to be written to file name. Never blocks."""
+        try:
+            self.queue.put_nowait((name, image))
+        except queue.Full:
+            print("Recorder busy, dropped %s" % name)
+
+    def run(self):
+        """Write entries until stopped."""
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+            if len(entry) == 2:
+                write_image(*entry)
+                continue
+            t, frame, state = entry
+            number = -1
+            if frame is not None:
+                number = self.session.count
+                self.session.add(frame, t)
+                self.frame_slots.release()
+                self.frames += 1
+            self.state_file.write('%.6f,%d,%s\n' % (
+                t, number, ','.join('%.6g' % v for v in state)))
+
+    def stats(self):
+        """Return text describing what was recorded."""
+        return "recorded updates:%d frames:%d dropped frames:%d states:%d" % (
+            self.updates, self.frames, self.dropped_frames,
+            self.dropped_states)
+
+
+def write_image(name, image):
+    """Write image to file name and report it."""
+    if cv2.imwrite(name, image):
+        print("Captured %s" % name)
+    else:
+        print("Error writing %s" % name)
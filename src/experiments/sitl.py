@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+
+"""Fly Fly in a simulator, without quadcopter, transmitter or camera.
+
+A simulated quadcopter takes the stick values Fly sends, turned into
+channel values by command.normalize() exactly as the transmitter gets
+them, and moves with simple dynamics: each stick sets a target speed
+(forward, sideways, climb and yaw rate) that the quadcopter reaches
+with time constant Quad.TAU. The camera looks straight ahead from it
+and sees the gates of a course laid out on a circle, rendered by
+synthetic.Generator through the calibrated camera. Only the nearest
+gate wholly inside the image is drawn.
+
+SimCommand stands in for command.Command and SimCapture for the
+camera. Time is simulated: each frame moves the simulation on by
+1/fps seconds however long the frame took to process, so it runs as
+fast as Fly can keep up with, and Fly is given the simulated clock.
+Runs are repeatable for a given '--seed'. The command worked out from
+a frame takes effect at the next frame.
+
+The simulation counts gates flown through, inside the markers' width
+and GATE_HALF_HEIGHT of their center, and the time of each lap. It
+ends after '--duration' simulated seconds, when Fly stops flying or,
+with '--expect-gates N', once N gates are flown through. The exit
+status is then 1 unless the first N gates of the course were flown
+through in order and Fly did not stop flying, and so disarm in the
+air, by itself, for use as a regression test. test_sitl.py runs
+REGRESSION_ARGS with several seeds, which the current gains meet.
+
+Fly's own height PID does not hold the simulated quadcopter's height,
+which center stick holds, and is only changed for real flight on the
+strength of flight data. '--height-gains kp,ki' replaces it in the
+simulator alone with a forward acting, proportional on measurement
+PID that starts from the center stick.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import math
+import sys
+import time
+import numpy as np
+import command
+import fly
+import pid
+import pose
+import synthetic
+
+GATE_HALF_HEIGHT = 20.0     # cm above and below the markers' center.
+
+# Regression run: a lap of four gates, searching for each after the
+# one before.
+REGRESSION_ARGS = ['--gates', '1,2,3,4', '--height-gains', '0.013,0.011',
+                   '--expect-gates', '4']
+MIN_DEPTH = 10.0            # cm in front of the camera to draw a gate.
+
+def yaw_matrix(yaw):
+    """Return rotation of yaw radians about the downward y axis, which
+       turns the forward z axis to the right."""
+    c, s = math.cos(yaw), math.sin(yaw)
+    return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+
+
+class Quad:
+    """Simple quadcopter. Positions are in cm with x right, y down and
+       z forward at the start; the ground is at y = 0."""
+
+    TAU = 0.3               # Seconds to reach a new target speed.
+    MAX_FORWARD = 300.0     # cm/s at full forward stick.
+    MAX_SIDEWAYS = 200.0    # cm/s at full direction stick.
+    MAX_CLIMB = 150.0       # cm/s at full throttle, 0 at center stick.
+    MAX_YAW_RATE = math.radians(180)  # Radians/s at full rotation stick.
+
+    def __init__(self, position, yaw):
+        """Initialize quadcopter at rest at position facing yaw."""
+        self.position = np.array(position, np.float64)
+        self.velocity = np.zeros(3)
+        self.yaw = yaw
+        self.yaw_rate = 0.0
+        self.armed = False
+        self.sticks = np.zeros(4)   # Throttle, direction, forward, rotation.
+
+    def set_channels(self, channels):
+        """Take stick channel values from command.normalize()."""
+        span = command.Command.MAX_VALUE - command.Command.MIN_VALUE
+        self.sticks = ((np.asarray(channels, np.float64) -
+                        command.Command.MIN_VALUE)/span*2 - 1)
+
+    def step(self, dt):
+        """Move on by dt seconds."""
+        throttle, direction, forward, rotation = self.sticks
+        if not self.armed:
+            throttle, direction, forward, rotation = -1.0, 0.0, 0.0, 0.0
+        r = yaw_matrix(self.yaw)
+        target = r.dot([direction*Quad.MAX_SIDEWAYS, 0.0,
+                        forward*Quad.MAX_FORWARD])
+        target[1] = -throttle*Quad.MAX_CLIMB
+        k = min(dt/Quad.TAU, 1.0)
+        self.velocity += (target - self.velocity)*k
+        self.yaw_rate += (rotation*Quad.MAX_YAW_RATE - self.yaw_rate)*k
+        self.position += self.velocity*dt
+        self.yaw += self.yaw_rate*dt
+        if self.position[1] > 0:    # On the ground.
+            self.position[1] = 0.0
+            self.velocity[:] = 0.0
+
+
+class Simulator:
+    """Quadcopter flying a course of gates on a circle."""
+
+    def __init__(self, marker_ids, radius=150.0, height=100.0, start=120.0,
+                 substeps=10, blur=0.0, noise=0.0, seed=None):
+        """Initialize course of marker_ids gates placed counterclockwise
+           seen from above, at height cm, with the quadcopter start cm
+           before the first gate, hovering and facing it."""
+        self.time = 0.0
+        self.substeps = substeps
+        self.gates = []         # (marker_id, position, yaw) in order.
+        n = len(marker_ids)
+        for i, marker_id in enumerate(marker_ids):
+            a = 2*math.pi*i/max(n, 1)
+            # Gates face along the circle, flown turning right.
+            position = np.array([radius*(1 - math.cos(a)), -height,
+                                 radius*math.sin(a)])
+            self.gates.append((marker_id, position, a))
+        self.quad = Quad(self.gates[0][1] - [0, 0, start], 0.0)
+        self.generators = {}
+        for marker_id in set(marker_ids):
+            self.generators[marker_id] = synthetic.Generator(
+                marker_id, blur=blur, noise=noise, seed=seed)
+        self.passed = []        # (time, gate index) flown through.
+        self.last_local = [self.local(i) for i in range(n)]
+
+    def now(self):
+        """Return the simulated time."""
+        return self.time
+
+    def local(self, i):
+        """Return quadcopter position in the frame of gate i."""
+        _, position, yaw = self.gates[i]
+        return yaw_matrix(yaw).T.dot(self.quad.position - position)
+
+    def step(self, dt):
+        """Move on by dt seconds, noting gates flown through."""
+        for _ in range(self.substeps):
+            self.quad.step(dt/self.substeps)
+            self.time += dt/self.substeps
+            for i in range(len(self.gates)):
+                local = self.local(i)
+                last = self.last_local[i]
+                if (last[2] < 0 <= local[2] and
+                        abs(local[0]) < pose.Pose.target_objp[:, 0].max() and
+                        abs(local[1]) < GATE_HALF_HEIGHT):
+                    self.passed.append((self.time, i))
+                self.last_local[i] = local
+
+    def render(self):
+        """Return the camera image of the nearest gate in view."""
+        camera = yaw_matrix(self.quad.yaw)
+        nearest = None
+        for marker_id, position, yaw in self.gates:
+            r = camera.T.dot(yaw_matrix(yaw))
+            t = camera.T.dot(position - self.quad.position)
+            if self.in_view(marker_id, r, t) and (nearest is None or
+                                                  t[2] < nearest[2][2]):
+                nearest = (marker_id, r, t)
+        if nearest is None:
+            return empty_image(self.generators[self.gates[0][0]])
+        marker_id, r, t = nearest
+        rvecs = np.array([0.0, math.atan2(r[0, 2], r[0, 0]), 0.0])
+        return self.generators[marker_id].render(rvecs, t)
+
+    def in_view(self, marker_id, r, t):
+        """Return True if the whole board of a gate at rotation r and
+           translation t from the camera is in the image."""
+        corners = r.dot(board_corners().T) + t.reshape(3, 1)
+        if corners[2].min() < MIN_DEPTH:
+            return False
+        gen = self.generators[marker_id]
+        pixels = gen.camera_matrix.dot(corners)
+        x, y = pixels[:2]/pixels[2]
+        w, h = gen.size
+        return x.min() >= 0 and y.min() >= 0 and x.max() < w and y.max() < h
+
+    def laps(self):
+        """Return times of completed laps."""
+        n = len(self.gates)
+        times = []
+        count = 0
+        start = 0.0
+        for t, i in self.passed:
+            if i == count % n:
+                count += 1
+                if count % n == 0:
+                    times.append(t - start)
+                    start = t
+        return times
+
+
+def board_corners():
+    """Return the corners of the marker board in gate coordinates."""
+    objp = pose.Pose.target_objp
+    margin = pose.Pose.target_size/2
+    x0, y0 = objp[:, 0].min() - margin, objp[:, 1].min() - margin
+    x1, y1 = objp[:, 0].max() + margin, objp[:, 1].max() + margin
+    return np.array([[x0, y0, 0], [x1, y0, 0], [x1, y1, 0], [x0, y1, 0]])
+
+def empty_image(gen):
+    """Return an image with no gate in it."""
+    w, h = gen.size
+    return np.full((h, w, 3), synthetic.Generator.BACKGROUND, np.uint8)
+
+
+def sim_height_pid(kp, ki):
+    """Return height PID for the simulated quadcopter, holding height
+       from the center stick."""
+    p = pid.PID(True)
+    p.set_output_limits(-1.0, 1.0)
+    p.set_initial_output(0.0)
+    p.set_tunings(kp, ki, 0.0, False)
+    return p
+
+
+class SimCommand:
+    """Stands in for command.Command, flying the simulated quadcopter."""
+
+    def __init__(self, quad):
+        """Initialize command of quad."""
+        self.quad = quad
+        self.commands = 0
+
+    def bind(self):
+        """Bind to quadcopter"""
+
+    def arm(self):
+        """Arm quadcopter"""
+        self.quad.armed = True
+
+    def disarm(self):
+        """Disarm quadcopter"""
+        self.quad.armed = False
+
+    def telemetry(self, on):
+        """No telemetry in the simulator."""
+
+    def command(self, throttle, direction, forward, rotation):
+        """Command each degree of freedom using value -1.0 to 1.0"""
+        self.quad.set_channels([int(command.normalize(v)) for v in
+                                (throttle, direction, forward, rotation)])
+        self.commands += 1
+
+    def close(self):
+        """Nothing to close."""
+
+
+class SimCapture:
+    """Stands in for the camera, moving the simulation on each frame."""
+
+    def __init__(self, sim, fps=30.0):
+        """Initialize camera on sim taking fps frames a second."""
+        self.sim = sim
+        self.period = 1.0/fps
+        self.timestamp = 0.0
+        self.dropped = 0
+
+    def read(self):
+        """Return (ok, frame) for the next frame."""
+        self.sim.step(self.period)
+        self.timestamp = self.sim.now()
+        return True, self.sim.render()
+
+    def release(self):
+        """Nothing to release."""
+
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Fly in the simulator')
+    parser.add_argument('-d', '--duration',
+                        help='simulated seconds to fly',
+                        required=False, type=float, default=30.0)
+    parser.add_argument('--fps',
+                        help='camera frames per second',
+                        required=False, type=float, default=30.0)
+    parser.add_argument('--radius',
+                        help='radius of the course in cm',
+                        required=False, type=float, default=150.0)
+    parser.add_argument('--blur',
+                        help='camera blur sigma in pixels',
+                        required=False, type=float, default=0.0)
+    parser.add_argument('--noise',
+                        help='camera noise in gray levels',
+                        required=False, type=float, default=2.0)
+    parser.add_argument('--seed',
+                        help='random seed',
+                        required=False, type=int, default=1)
+    parser.add_argument('--height-gains',
+                        help='fly height with a "kp,ki" PID for the '
+                        'simulated quadcopter instead of Fly\'s own',
+                        required=False, default=None)
+    parser.add_argument('--expect-gates',
+                        help='stop after this many gates, exiting with '
+                        'status 1 unless they are the course in order',
+                        required=False, type=int, default=0)
+    f = fly.Fly(parser)
+    args = parser.parse_args()
+    args.telemetry = False
+    args.control_rate = 0.0     # Control runs on the simulated clock.
+    ids = [int(i) for i in args.gates.split(',')] if args.gates else [args.id]
+    pose.set_calibration(args.calibration)
+    sim = Simulator(ids, args.radius, blur=args.blur, noise=args.noise,
+                    seed=args.seed)
+    cmd = SimCommand(sim.quad)
+    f.setup(args, cmd)
+    if args.height_gains:
+        kp, ki = (float(v) for v in args.height_gains.split(','))
+        f.height_pid = sim_height_pid(kp, ki)
+    f.clock = sim.now
+    cap = SimCapture(sim, args.fps)
+
+    f.arm()
+    f.start_flying()
+    frames = 0
+    start = time.perf_counter()
+    while (sim.now() < args.duration and f.flying and
+           not 0 < args.expect_gates <= len(sim.passed)):
+        _, frame = cap.read()
+        f.update(frame)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    stopped = not f.flying
+    f.stop_flying()
+    f.close()
+
+    print("simulated %.1f s in %.1f s (%.1fx real time), %d frames, "
+          "%.1f frames/s, %d commands" % (
+              sim.now(), elapsed, sim.now()/elapsed, frames,
+              frames/elapsed, cmd.commands))
+    print("gates flown through: %d" % len(sim.passed))
+    for t, i in sim.passed:
+        print("  %7.2f s gate %d (ID %d)" % (t, i, sim.gates[i][0]))
+    for n, t in enumerate(sim.laps()):
+        print("lap %d: %.2f s" % (n + 1, t))
+    x, y, z = sim.quad.position
+    print("final position x:%.0f height:%.0f z:%.0f cm" % (x, -y, z))
+    if stopped:
+        print("Fly stopped flying")
+    if args.expect_gates:
+        flown = [i for _, i in sim.passed]
+        course = [n % len(sim.gates) for n in range(args.expect_gates)]
+        if stopped or flown != course:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Sources of video frames: camera, video file, image directory or session.
+
+Every source reads like cv2.VideoCapture, returning (ok, frame) from
+read(), and also sets 'timestamp' to the frame's time in seconds.
+Recorded sources replay in one of two modes:
+
+  REALTIME -- frames come out on the schedule of their timestamps. A
+              reader that falls behind gets the newest due frame and
+              the ones it missed are counted in 'dropped'.
+  FAST     -- every frame as fast as the reader takes them.
+
+A session is a directory holding an 'index.csv' with one line per
+frame, "time,chunk,offset,length", and chunk files 'chunk_NNNN.bin' of
+encoded images placed end to end. SessionWriter makes them.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import os
+import time
+import cv2
+import numpy as np
+
+REALTIME = 'realtime'
+FAST = 'fast'
+MODES = (REALTIME, FAST)
+
+INDEX_NAME = 'index.csv'
+
+def chunk_name(chunk):
+    """Return file name of a session chunk."""
+    return 'chunk_%04d.bin' % chunk
+
+
+def open_source(spec, mode=REALTIME, fps=30.0):
+    """Return a source for spec: a camera number, a session directory,
+       a directory of images (played at fps) or a video file. Raises
+       ValueError if spec is none of them."""
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if os.path.isfile(os.path.join(spec, INDEX_NAME)):
+        return SessionSource(spec, mode)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, mode, fps)
+    if not os.path.isfile(spec):
+        raise ValueError('no such camera, directory or video: %s' % spec)
+    return VideoSource(spec, mode)
+
+
+class CameraSource:
+    """Live frames from a camera."""
+
+    def __init__(self, index):
+        """Open camera number index."""
+        self.cap = cv2.VideoCapture(index)
+        self.timestamp = 0.0
+        self.dropped = 0
+
+    def read(self):
+        """Return (ok, frame) for the next frame."""
+        ok, frame = self.cap.read()
+        self.timestamp = time.monotonic()
+        return ok, frame
+
+    def release(self):
+        """Close the camera."""
+        self.cap.release()
+
+
+class Source:
+    """Recorded frames replayed in REALTIME or FAST mode.
+
+    Subclasses set 'times' to the frame times and supply skip() and
+    decode() to move past or decode the frame at 'index'.
+    """
+
+    def __init__(self, times, mode):
+        """Initialize source with frame times in seconds."""
+        self.times = np.asarray(times, np.float64)
+        self.mode = mode
+        self.index = 0          # Next frame to read.
+        self.start = None       # Clock time the first frame was due.
+        self.timestamp = 0.0    # Time of the last frame read.
+        self.dropped = 0        # Frames skipped to keep up.
+
+    def read(self):
+        """Return (ok, frame) for the next frame."""
+        if self.index >= len(self.times):
+            return False, None
+        if self.mode == REALTIME:
+            now = time.monotonic()
+            if self.start is None:
+                self.start = now - self.times[self.index]
+            # Skip frames whose successor is already due.
+            while (self.index + 1 < len(self.times) and
+                   now >= self.start + self.times[self.index + 1]):
+                self.skip()
+                self.index += 1
+                self.dropped += 1
+            delay = self.start + self.times[self.index] - now
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.decode()
+        self.timestamp = self.times[self.index]
+        self.index += 1
+        return frame is not None, frame
+
+    def skip(self):
+        """Move past the frame at index without decoding it."""
+
+    def decode(self):
+        """Return the frame at index or None."""
+        raise NotImplementedError
+
+    def release(self):
+        """Close the source."""
+
+
+class VideoSource(Source):
+    """Frames from a video file."""
+
+    def __init__(self, filename, mode=REALTIME):
+        """Open video filename, raising ValueError if it cannot be read."""
+        self.cap = cv2.VideoCapture(filename)
+        if not self.cap.isOpened():
+            raise ValueError('cannot read video: %s' % filename)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        Source.__init__(self, np.arange(count)/fps, mode)
+
+    def skip(self):
+        self.cap.grab()
+
+    def decode(self):
+        ok, frame = self.cap.read()
+        return frame if ok else None
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(Source):
+    """Frames from the images in a directory in name order."""
+
+    def __init__(self, directory, mode=REALTIME, fps=30.0):
+        """Open directory of images played at fps."""
+        self.names = [os.path.join(directory, name)
+                      for name in sorted(os.listdir(directory))]
+        Source.__init__(self, np.arange(len(self.names))/fps, mode)
+
+    def decode(self):
+        return cv2.imread(self.names[self.index])
+
+
+class SessionSource(Source):
+    """Frames from a recorded session directory."""
+
+    def __init__(self, directory, mode=REALTIME):
+        """Open session directory."""
+        self.directory = directory
+        index = np.loadtxt(os.path.join(directory, INDEX_NAME),
+                           delimiter=',', skiprows=1, ndmin=2).reshape(-1, 4)
+        self.chunks = index[:, 1].astype(int)
+        self.offsets = index[:, 2].astype(int)
+        self.lengths = index[:, 3].astype(int)
+        self.files = {}
+        Source.__init__(self, index[:, 0] - index[0, 0] if len(index) else [],
+                        mode)
+
+    def decode(self):
+        chunk = self.chunks[self.index]
+        f = self.files.get(chunk)
+        if f is None:
+            f = open(os.path.join(self.directory, chunk_name(chunk)), 'rb')
+            self.files[chunk] = f
+        f.seek(self.offsets[self.index])
+        data = f.read(self.lengths[self.index])
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def release(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+class SessionWriter:
+    """Write frames and their times into a session directory."""
+
+    def __init__(self, directory, ext='.jpg', chunk_bytes=64*1024*1024):
+        """Create session in directory encoding frames as ext. A new
+           chunk file is started once one reaches chunk_bytes."""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.ext = ext
+        self.chunk_bytes = chunk_bytes
+        self.chunk = -1
+        self.file = None
+        self.offset = 0
+        self.count = 0
+        self.index = open(os.path.join(directory, INDEX_NAME), 'w')
+        self.index.write('time,chunk,offset,length\n')
+
+    def add(self, frame, timestamp):
+        """Encode and add frame taken at timestamp seconds."""
+        ok, data = cv2.imencode(self.ext, frame)
+        if ok:
+            self.add_encoded(data.tobytes(), timestamp)
+
+    def add_encoded(self, data, timestamp):
+        """Add an already encoded frame."""
+        if self.file is None or self.offset >= self.chunk_bytes:
+            self.next_chunk()
+        self.file.write(data)
+        self.index.write('%.6f,%d,%d,%d\n' % (timestamp, self.chunk,
+                                              self.offset, len(data)))
+        self.offset += len(data)
+        self.count += 1
+
+    def next_chunk(self):
+        """Start a new chunk file."""
+        if self.file is not None:
+            self.file.close()
+        self.chunk += 1
+        self.offset = 0
+        self.file = open(os.path.join(self.directory,
+                                      chunk_name(self.chunk)), 'wb')
+
+    def close(self):
+        """Finish the session."""
+        if self.file is not None:
+            self.file.close()
+        self.index.close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""Sweep the Aruco detector profiles over a set of images.
+
+Every profile of pose.DETECTOR_PROFILES detects the gate's markers in
+the same images: a directory of real ones ('--source') and, with
+'--synthetic N', N gates rendered by synthetic.Generator with known
+poses. For each profile and image set it prints how many gates were
+found against the detection time per frame, and for the synthetic set
+the pose error against the truth, so a profile can be picked for the
+lighting of a venue. '--contrast' and '--brightness' change every
+image first (new = old*contrast + brightness) to try dim or washed out
+lighting without going there.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import os
+import sys
+import cv2
+import numpy as np
+import pose
+import synthetic
+
+def load_images(args):
+    """Return list of (name, frames, truth) image sets, truth being a
+       list of tvecs or None when unknown."""
+    sets = []
+    if args.source:
+        names = sorted(os.listdir(args.source))
+        frames = [cv2.imread(os.path.join(args.source, name))
+                  for name in names]
+        sets.append((args.source, frames, None))
+    if args.synthetic > 0:
+        gen = synthetic.Generator(args.id, blur=args.blur, noise=args.noise,
+                                  seed=args.seed)
+        frames = []
+        truth = []
+        for frame, _, tvecs in gen.generate(args.synthetic):
+            frames.append(frame)
+            truth.append(tvecs)
+        sets.append(('synthetic', frames, truth))
+    return sets
+
+def adjust(frame, contrast, brightness):
+    """Return frame with its lighting changed."""
+    if contrast == 1.0 and brightness == 0.0:
+        return frame
+    return cv2.convertScaleAbs(frame, alpha=contrast, beta=brightness)
+
+def sweep(grays, truth, marker_id, repeat):
+    """Detect and solve grays with the current profile and return
+       (found, ms per frame, median error cm or nan)."""
+    found = 0
+    ms = 0.0
+    errors = []
+    for i, gray in enumerate(grays):
+        e1 = cv2.getTickCount()
+        for _ in range(repeat):
+            corners, _ = pose.detect_markers(gray, marker_id)
+        ms += (cv2.getTickCount() - e1)/cv2.getTickFrequency()*1000/repeat
+        if len(corners) != 2:
+            continue
+        ok, _, tvecs = pose.position_markers(corners,
+                                             size=gray.shape[1::-1])
+        if not ok:
+            continue
+        found += 1
+        if truth is not None:
+            errors.append(np.linalg.norm(tvecs.ravel() - truth[i]))
+    median = np.median(errors) if errors else float('nan')
+    return found, ms/max(len(grays), 1), median
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Sweep detector profiles')
+    parser.add_argument('-i', '--id',
+                        help='marker ID to find',
+                        required=False, type=int, default=2)
+    parser.add_argument('-s', '--source',
+                        help='directory of images, empty for none',
+                        required=False, default='images')
+    parser.add_argument('--synthetic',
+                        help='synthetic gate images to add',
+                        required=False, type=int, default=200)
+    parser.add_argument('-p', '--profiles',
+                        help='comma separated profiles (default all)',
+                        required=False, default=None)
+    parser.add_argument('-n', '--repeat',
+                        help='times to repeat each detection',
+                        required=False, type=int, default=3)
+    parser.add_argument('--contrast',
+                        help='multiply every pixel by this',
+                        required=False, type=float, default=1.0)
+    parser.add_argument('--brightness',
+                        help='then add this to every pixel',
+                        required=False, type=float, default=0.0)
+    parser.add_argument('--blur',
+                        help='synthetic camera blur sigma in pixels',
+                        required=False, type=float, default=0.5)
+    parser.add_argument('--noise',
+                        help='synthetic camera noise in gray levels',
+                        required=False, type=float, default=3.0)
+    parser.add_argument('--seed',
+                        help='random seed',
+                        required=False, type=int, default=1)
+    args = parser.parse_args()
+
+    profiles = list(pose.DETECTOR_PROFILES)
+    if args.profiles:
+        profiles = args.profiles.split(',')
+    sets = []
+    for name, frames, truth in load_images(args):
+        grays = [pose.create_gray_frame(adjust(f, args.contrast,
+                                               args.brightness))
+                 for f in frames]
+        if grays:
+            sets.append((name, grays, truth))
+    if not sets:
+        parser.print_usage()
+        print("no images to sweep: give a --source directory with images "
+              "or --synthetic")
+        sys.exit(2)
+
+    print('%-10s %-12s %6s %6s %7s %9s %8s' % (
+        'profile', 'images', 'frames', 'found', 'rate', 'ms/frame',
+        'med cm'))
+    for profile in profiles:
+        pose.set_profile(profile)
+        pose.detect_markers(sets[0][1][0], args.id)     # Warm up.
+        for name, grays, truth in sets:
+            found, ms, error = sweep(grays, truth, args.id, args.repeat)
+            print('%-10s %-12s %6d %6d %6.1f%% %9.3f %8.2f' % (
+                profile, name, len(grays), found,
+                100.0*found/max(len(grays), 1), ms, error))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+"""Generate synthetic gate images with known poses.
+
+A gate is the pair of markers of pose.Pose.target_objp drawn with
+aruco.drawMarker on a white board. Images are rendered by casting the
+ray of every pixel through the camera of 'calibration.npz', including
+its lens distortion, onto the plane of the gate. The rays are worked
+out once per image size, so rendering a pose is one
+cv2.perspectiveTransform of all the rays onto the board and one
+cv2.remap of it, then blur and noise. The board is kept as an image
+pyramid and the level nearest the marker's size on screen is sampled so
+far away gates do not alias. The whole board must be in front of the
+camera.
+
+Poses are (rvecs, tvecs) as solvePnP gives them, so the answer of
+pose.position_markers() can be compared with the truth directly.
+
+Run on its own it either writes '--count' images and a 'truth.csv' of
+their poses into '--output' or, with '--benchmark', solves them with
+pose.Pose and reports the generation rate, the solve time, how many
+gates were found and the pose errors against the truth by distance.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import math
+import os
+import time
+import cv2
+from cv2 import aruco
+import numpy as np
+import pose
+
+def camera_matrix(size):
+    """Return the calibrated camera matrix scaled to image size."""
+    return pose.context().sized_camera_matrix(*size)
+
+def rotation_vectors(pitch, yaw, roll):
+    """Return rotation vectors, one per row, for arrays of angles in
+       degrees about the x, y and z axes applied in that order."""
+    x, y, z = (np.radians(np.asarray(a, np.float64)) for a in
+               (pitch, yaw, roll))
+    cx, sx, cy, sy, cz, sz = (np.cos(x), np.sin(x), np.cos(y), np.sin(y),
+                              np.cos(z), np.sin(z))
+    # R = Rz*Ry*Rx for every set of angles at once.
+    r = np.empty(x.shape + (3, 3))
+    r[..., 0, 0] = cz*cy
+    r[..., 0, 1] = cz*sy*sx - sz*cx
+    r[..., 0, 2] = cz*sy*cx + sz*sx
+    r[..., 1, 0] = sz*cy
+    r[..., 1, 1] = sz*sy*sx + cz*cx
+    r[..., 1, 2] = sz*sy*cx - cz*sx
+    r[..., 2, 0] = -sy
+    r[..., 2, 1] = cy*sx
+    r[..., 2, 2] = cy*cx
+    # Rotation matrix to axis times angle.
+    angle = np.arccos(np.clip((np.trace(r, axis1=-2, axis2=-1) - 1)/2,
+                              -1, 1))
+    axis = np.stack([r[..., 2, 1] - r[..., 1, 2],
+                     r[..., 0, 2] - r[..., 2, 0],
+                     r[..., 1, 0] - r[..., 0, 1]], -1)
+    scale = np.where(angle > 1e-9, angle/(2*np.sin(np.maximum(angle, 1e-9))),
+                     0.5)
+    return axis*scale[..., None]
+
+def random_poses(n, rng, distance=(40.0, 300.0), angle=30.0, offset=0.25):
+    """Return (rvecs, tvecs), n rows each, of gates between distance cm
+       away, turned up to angle degrees about each axis and off center
+       by up to offset of the distance."""
+    d = rng.uniform(distance[0], distance[1], n)
+    tvecs = np.column_stack([rng.uniform(-offset, offset, n)*d,
+                             rng.uniform(-offset, offset, n)*d*0.75, d])
+    rvecs = rotation_vectors(*rng.uniform(-angle, angle, (3, n)))
+    return rvecs, tvecs
+
+
+class Generator:
+    """Render gate images for poses."""
+
+    PIXELS_PER_CM = 20      # Board resolution at pyramid level 0.
+    LEVELS = 6              # Board pyramid levels.
+    BACKGROUND = 90         # Gray level around the board.
+
+    def __init__(self, marker_id=2, size=pose.CALIBRATION_SIZE,
+                 distort=True, blur=0.0, noise=0.0, seed=None):
+        """Initialize generator of size images of the gate with
+           marker_id. blur is the Gaussian sigma and noise the standard
+           deviation of added noise, both in pixels and gray levels."""
+        self.size = size
+        self.blur = blur
+        self.noise = noise
+        self.rng = np.random.RandomState(seed)
+        self.camera_matrix = camera_matrix(size)
+        self.boards, self.origin = make_board(marker_id, Generator.LEVELS)
+        self.rays = make_rays(size, self.camera_matrix,
+                              pose.context().dist_coeffs if distort else None)
+
+    def render(self, rvecs, tvecs):
+        """Return BGR image of the gate at pose (rvecs, tvecs)."""
+        w, h = self.size
+        r, _ = cv2.Rodrigues(np.asarray(rvecs, np.float64).reshape(3, 1))
+        m = np.column_stack([r[:, 0], r[:, 1], np.ravel(tvecs)])
+
+        # Pick the board level with marker pixels closest to the screen's.
+        side = self.camera_matrix[0, 0]*pose.Pose.target_size/abs(m[2, 2])
+        level = int(np.clip(math.log2(max(pose.Pose.target_size *
+                                          Generator.PIXELS_PER_CM/side, 1)),
+                            0, Generator.LEVELS - 1))
+        scale = Generator.PIXELS_PER_CM/2**level
+        board_from_plane = np.array([[scale, 0, -self.origin[0]*scale],
+                                     [0, scale, -self.origin[1]*scale],
+                                     [0, 0, 1]])
+
+        # Ray to plane point to board pixel for every pixel at once.
+        maps = cv2.perspectiveTransform(
+            self.rays, board_from_plane.dot(np.linalg.inv(m)))
+        gray = cv2.remap(self.boards[level], maps, None, cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT,
+                         borderValue=Generator.BACKGROUND)
+        if self.blur > 0:
+            gray = cv2.GaussianBlur(gray, (0, 0), self.blur)
+        if self.noise > 0:
+            noisy = (self.rng.standard_normal((h, w))*self.noise).astype(
+                np.float32)
+            noisy += gray
+            gray = np.clip(noisy, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    def generate(self, n, **kwargs):
+        """Yield (image, rvecs, tvecs) for n random poses. kwargs are
+           passed on to random_poses()."""
+        rvecs, tvecs = random_poses(n, self.rng, **kwargs)
+        for r, t in zip(rvecs, tvecs):
+            yield self.render(r, t), r, t
+
+
+def make_board(marker_id, levels):
+    """Return the board pyramid and the plane (x, y) in cm of the
+       board's top left corner."""
+    size = pose.Pose.target_size
+    objp = pose.Pose.target_objp
+    margin = size/2             # White quiet zone around the markers.
+    x0, y0 = objp[:, 0].min() - margin, objp[:, 1].min() - margin
+    x1, y1 = objp[:, 0].max() + margin, objp[:, 1].max() + margin
+    ppc = Generator.PIXELS_PER_CM
+    board = np.full((int(round((y1 - y0)*ppc)), int(round((x1 - x0)*ppc))),
+                    255, np.uint8)
+    side = int(round(size*ppc))
+    marker = aruco.drawMarker(pose.context().aruco_dict, marker_id, side)
+    for corner in (objp[0], objp[4]):   # Top left of each marker.
+        x = int(round((corner[0] - x0)*ppc))
+        y = int(round((corner[1] - y0)*ppc))
+        board[y:y+side, x:x+side] = marker
+    boards = [board]
+    for _ in range(levels - 1):
+        boards.append(cv2.pyrDown(boards[-1]))
+    return boards, (x0, y0)
+
+def make_rays(size, k, dist_coeffs):
+    """Return h x w x 2 normalized image coordinates of the camera ray
+       through every pixel, bent by dist_coeffs unless it is None."""
+    w, h = size
+    u, v = np.meshgrid(np.arange(w, dtype=np.float64),
+                       np.arange(h, dtype=np.float64))
+    pixels = np.stack([u.ravel(), v.ravel()], -1)
+    if dist_coeffs is None:
+        xy = (pixels - k[:2, 2])/np.diag(k)[:2]
+    else:
+        xy = cv2.undistortPoints(pixels.reshape(-1, 1, 2), k,
+                                 dist_coeffs).reshape(-1, 2)
+    return xy.reshape(h, w, 2).astype(np.float32)
+
+def rotation_error(rvecs1, rvecs2):
+    """Return the angle in degrees between two rotation vectors."""
+    r1, _ = cv2.Rodrigues(np.asarray(rvecs1, np.float64).reshape(3, 1))
+    r2, _ = cv2.Rodrigues(np.asarray(rvecs2, np.float64).reshape(3, 1))
+    r, _ = cv2.Rodrigues(r1.T.dot(r2))
+    return math.degrees(np.linalg.norm(r))
+
+def benchmark(gen, count, marker_id, **kwargs):
+    """Solve count generated images and print rates and errors."""
+    p = pose.Pose()
+    truth = []
+    solved = []
+    gen_ms = 0.0
+    solve_ms = 0.0
+    t = time.perf_counter()
+    for frame, rvecs, tvecs in gen.generate(count, **kwargs):
+        gen_ms += (time.perf_counter() - t)*1000
+        t = time.perf_counter()
+        found = p.solve(frame, marker_id)
+        solve_ms += (time.perf_counter() - t)*1000
+        truth.append(tvecs[2])
+        if found:
+            solved.append((tvecs[2],
+                           np.linalg.norm(p.tvecs.ravel() - tvecs),
+                           rotation_error(p.rvecs, rvecs)))
+        t = time.perf_counter()
+    print('generate %8.3f ms/image %8.1f images/s' % (
+        gen_ms/count, count*1000/gen_ms))
+    print('solve    %8.3f ms/image %8.1f images/s' % (
+        solve_ms/count, count*1000/solve_ms))
+    truth = np.array(truth)
+    solved = np.array(solved).reshape(-1, 3)
+    print()
+    print('%-12s %6s %6s %10s %10s %10s %10s' % (
+        'distance cm', 'images', 'found', 'med cm', 'max cm', 'med deg',
+        'max deg'))
+    edges = np.linspace(truth.min(), truth.max() + 1e-6, 6)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        total = np.count_nonzero((truth >= lo) & (truth < hi))
+        rows = solved[(solved[:, 0] >= lo) & (solved[:, 0] < hi)]
+        line = '%5.0f-%-6.0f %6d %6d' % (lo, hi, total, len(rows))
+        if len(rows):
+            line += ' %10.3f %10.3f %10.3f %10.3f' % (
+                np.median(rows[:, 1]), rows[:, 1].max(),
+                np.median(rows[:, 2]), rows[:, 2].max())
+        print(line)
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Generate gate images')
+    parser.add_argument('-i', '--id',
+                        help='marker ID of the gate',
+                        required=False, type=int, default=2)
+    parser.add_argument('-n', '--count',
+                        help='number of images',
+                        required=False, type=int, default=100)
+    parser.add_argument('-o', '--output',
+                        help='directory to write images and truth.csv into',
+                        required=False, default='synthetic')
+    parser.add_argument('-b', '--benchmark',
+                        help='solve the images and report accuracy '
+                        'instead of writing them',
+                        required=False, action='store_true')
+    parser.add_argument('--size',
+                        help='image size WxH',
+                        required=False, default='640x480')
+    parser.add_argument('--min-distance',
+                        help='nearest gate in cm',
+                        required=False, type=float, default=40.0)
+    parser.add_argument('--max-distance',
+                        help='farthest gate in cm',
+                        required=False, type=float, default=300.0)
+    parser.add_argument('--angle',
+                        help='largest gate rotation about each axis in degrees',
+                        required=False, type=float, default=30.0)
+    parser.add_argument('--no-distort',
+                        help='leave out the lens distortion',
+                        required=False, action='store_true')
+    parser.add_argument('--blur',
+                        help='Gaussian blur sigma in pixels',
+                        required=False, type=float, default=0.0)
+    parser.add_argument('--noise',
+                        help='noise standard deviation in gray levels',
+                        required=False, type=float, default=0.0)
+    parser.add_argument('--seed',
+                        help='random seed',
+                        required=False, type=int, default=None)
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.split('x'))
+    gen = Generator(args.id, size, not args.no_distort, args.blur,
+                    args.noise, args.seed)
+    kwargs = {'distance': (args.min_distance, args.max_distance),
+              'angle': args.angle}
+    if args.benchmark:
+        benchmark(gen, args.count, args.id, **kwargs)
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, 'truth.csv'), 'w') as f:
+        f.write('name,rx,ry,rz,tx,ty,tz\n')
+        for i, (frame, rvecs, tvecs) in enumerate(gen.generate(args.count,
+                                                               **kwargs)):
+            name = 'synthetic_%05d.png' % i
+            cv2.imwrite(os.path.join(args.output, name), frame)
+            f.write('%s,%s\n' % (name, ','.join(
+                '%.6f' % v for v in np.concatenate([rvecs, tvecs]))))
+    print('Wrote %d images into %s' % (args.count, args.output))
+
+if __name__ == "__main__":
+    main()
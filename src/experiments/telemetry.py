@@ -0,0 +1,120 @@
+"""Read telemetry forwarded by the transmitter into a ring buffer.
+
+The transmitter forwards each S.Port telemetry value it decodes as a
+line "T <millis> <sensorID> <value>". A reader thread parses these
+lines and adds them to a fixed size ring buffer along with the time
+they arrived. The vision loop can query the buffer at any time without
+taking a lock.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import threading
+import time
+import numpy as np
+
+# Columns of a telemetry sample.
+TIME = 0            # time.monotonic() when the sample arrived.
+DEVICE_TIME = 1     # Transmitter millis() when the sample was decoded.
+SENSOR = 2          # S.Port sensor ID.
+VALUE = 3           # Raw sensor value.
+COLUMNS = 4
+
+# S.Port accelerometer sensor IDs. Values are in hundredths of a g.
+ACCX_ID = 0x700
+ACCY_ID = 0x710
+ACCZ_ID = 0x720
+ACC_SCALE = 0.01
+
+class RingBuffer:
+    """Fixed size buffer of the newest samples.
+
+    One thread adds samples while any number of others read without a
+    lock. A sample slot is written before the count is bumped, so
+    readers only ever see complete samples unless the writer laps them
+    in the middle of a copy, which would take a whole buffer of samples.
+    """
+
+    def __init__(self, size, columns=COLUMNS):
+        """Initialize buffer holding size samples."""
+        self.size = size
+        self.data = np.zeros((size, columns))
+        self.count = 0          # Samples ever added.
+
+    def add(self, sample):
+        """Add a sample, overwriting the oldest if full."""
+        self.data[self.count % self.size] = sample
+        self.count += 1
+
+    def latest(self, n=1):
+        """Return a copy of up to n newest samples, oldest first."""
+        count = self.count
+        n = min(n, count, self.size)
+        return self.data[np.arange(count - n, count) % self.size]
+
+    def since(self, t):
+        """Return a copy of samples that arrived after time t."""
+        samples = self.latest(self.size)
+        return samples[samples[:, TIME] > t]
+
+
+class Telemetry:
+    """Read telemetry from the transmitter behind a command.Command."""
+
+    READ_TIMEOUT = 0.1          # Seconds between checks for stopping.
+
+    def __init__(self, cmd, size=4096):
+        """Initialize telemetry for cmd holding size samples."""
+        self.cmd = cmd
+        self.samples = RingBuffer(size)
+        self.bad_lines = 0      # Telemetry lines that did not parse.
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Ask for telemetry and start reading it."""
+        self.cmd.serial.timeout = Telemetry.READ_TIMEOUT
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.cmd.telemetry(True)
+
+    def stop(self):
+        """Stop telemetry and the reader."""
+        self.cmd.telemetry(False)
+        self.running = False
+        self.thread.join()
+
+    def run(self):
+        """Add telemetry lines to the buffer as they arrive."""
+        while self.running:
+            try:
+                line = self.cmd.serial.readline()
+            except (OSError, TypeError):
+                break
+            if not line.startswith(b'T '):
+                continue
+            now = time.monotonic()
+            try:
+                _, ms, sensor, value = line.split()
+                self.samples.add((now, int(ms), int(sensor), int(value)))
+            except ValueError:
+                self.bad_lines += 1
+
+    def latest_acceleration(self, window=64):
+        """Return (time, x, y, z) of the newest acceleration in g from the
+           last window samples or None if any axis is missing."""
+        samples = self.samples.latest(window)
+        result = [0.0, 0.0, 0.0, 0.0]
+        for axis, sensor in enumerate((ACCX_ID, ACCY_ID, ACCZ_ID)):
+            rows = samples[samples[:, SENSOR] == sensor]
+            if len(rows) == 0:
+                return None
+            result[0] = max(result[0], rows[-1, TIME])
+            result[axis + 1] = rows[-1, VALUE]*ACC_SCALE
+        return tuple(result)
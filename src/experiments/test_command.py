@@ -0,0 +1,132 @@
+"""Tests of the command library against the fake transmitter.
+
+Run from this directory with 'python3 -m unittest'.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import time
+import unittest
+import command
+import faketransmitter
+
+STICKS = [(-1.0, 0.0, 0.5, 1.0), (0.25, -0.75, -1.0, 0.1),
+          (1.0, 1.0, 1.0, 1.0), (-1.0, -1.0, -1.0, -1.0)]
+
+def channels(sticks):
+    """Return channel values the transmitter gets for sticks."""
+    return tuple(int(command.normalize(v)) for v in sticks)
+
+
+class BinaryFramingTest(unittest.TestCase):
+    """encode_binary(), decode_binary() and crc8()."""
+
+    def test_crc8(self):
+        """CRC-8 with polynomial 0x07 of the standard check string."""
+        self.assertEqual(command.crc8(b'123456789'), 0xF4)
+        self.assertEqual(command.crc8(b''), 0)
+
+    def test_round_trip(self):
+        """Frames decode to the channels they were encoded from."""
+        for sticks in STICKS:
+            frame = command.encode_binary(*sticks)
+            self.assertEqual(len(frame), command.PAYLOAD_SIZE + 2)
+            self.assertEqual(frame[0], command.SYNC)
+            self.assertEqual(command.decode_binary(frame), channels(sticks))
+
+    def test_bad_frames(self):
+        """Corrupt, unsynced or short frames decode to None."""
+        frame = command.encode_binary(*STICKS[1])
+        for i in range(1, len(frame)):
+            bad = bytearray(frame)
+            bad[i] ^= 0x10
+            self.assertIsNone(command.decode_binary(bytes(bad)))
+        self.assertIsNone(command.decode_binary(b'\x00' + frame[1:]))
+        self.assertIsNone(command.decode_binary(frame[:-1]))
+
+
+class AsyncCommandTest(unittest.TestCase):
+    """AsyncCommand writing to FakeTransmitter."""
+
+    def setUp(self):
+        self.fake = faketransmitter.FakeTransmitter()
+
+    def tearDown(self):
+        self.fake.close()
+
+    def open(self, period):
+        """Return AsyncCommand on the fake with period between commands."""
+        cmd = command.AsyncCommand(self.fake.ttyname, period=period)
+        self.assertTrue(cmd.binary)
+        return cmd
+
+    def received(self):
+        """Return channel values of the stick commands received."""
+        with self.fake.lock:
+            return [c[1:] for c in self.fake.commands]
+
+    def test_latest_command_wins(self):
+        """Commands replaced before they are written are dropped."""
+        cmd = self.open(0.2)
+        cmd.command(*STICKS[0])
+        self.assertTrue(self.fake.wait_for_commands(1))
+        # The writer now waits out the period, so the next two are
+        # replaced and only the last is sent.
+        for sticks in STICKS[1:]:
+            cmd.command(*sticks)
+        self.assertTrue(cmd.flush(1.0))
+        self.assertTrue(self.fake.wait_for_commands(2))
+        cmd.close()
+        self.assertEqual(self.received(),
+                         [channels(STICKS[0]), channels(STICKS[-1])])
+        self.assertEqual(cmd.sent, 2)
+        self.assertEqual(cmd.dropped, 2)
+
+    def test_rate_limit(self):
+        """Stick commands go out at most once per period."""
+        period = 0.05
+        cmd = self.open(period)
+        end = time.monotonic() + 0.5
+        count = 0
+        while time.monotonic() < end:
+            cmd.command(*STICKS[count % len(STICKS)])
+            count += 1
+            time.sleep(0.001)
+        cmd.close()
+        with self.fake.lock:
+            times = [c[0] for c in self.fake.commands]
+        self.assertEqual(len(times), cmd.sent)
+        self.assertEqual(cmd.sent + cmd.dropped, count)
+        self.assertLessEqual(len(times), 0.5/period + 2)
+        self.assertGreaterEqual(len(times), 0.5/period/2)
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        # Arrival times jitter, but never by half a period.
+        self.assertGreater(min(gaps), period/2)
+
+    def test_flush_and_close(self):
+        """flush() and close() wait for queued actions and commands."""
+        cmd = self.open(command.AsyncCommand.UPDATE_PERIOD)
+        cmd.arm()
+        cmd.command(*STICKS[0])
+        self.assertTrue(cmd.flush(1.0))
+        self.assertEqual(cmd.queue_depth(), 0)
+        self.assertTrue(self.fake.wait_for_commands(1))
+        cmd.command(*STICKS[1])
+        cmd.close()
+        self.assertFalse(cmd.thread.is_alive())
+        self.assertTrue(self.fake.wait_for_commands(2))
+        self.assertEqual(self.received(),
+                         [channels(STICKS[0]), channels(STICKS[1])])
+        with self.fake.lock:
+            chars = [c[1] for c in self.fake.chars]
+        # Disarmed on opening, then armed.
+        self.assertEqual(chars, ['d', 'a'])
+
+
+if __name__ == "__main__":
+    unittest.main()
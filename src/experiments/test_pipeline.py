@@ -0,0 +1,139 @@
+"""Tests of the capture and fly pipeline replaying an image directory.
+
+Run from this directory with 'python3 -m unittest'.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import cv2
+import numpy as np
+import pipeline
+import source
+
+FRAMES = 20
+
+class FakeFly:
+    """Stand in for fly.Fly noting the frames and commands it gets."""
+
+    def __init__(self, delay=0.0):
+        """Initialize fly taking delay seconds over each frame."""
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.frames = []        # Number of each frame updated with.
+        self.commands = []      # (ch, frame number or None).
+        self.flying = True
+
+    def update(self, frame):
+        time.sleep(self.delay)
+        with self.lock:
+            self.frames.append(frame_number(frame))
+
+    def command(self, ch, frame):
+        with self.lock:
+            if ch in pipeline.STOP_KEYS:
+                self.flying = False
+            number = None if frame is None else frame_number(frame)
+            self.commands.append((ch, number))
+        return True
+
+
+def frame_number(frame):
+    """Return the number written into a frame by make_images()."""
+    return int(frame[0, 0, 0])
+
+
+def make_images(directory):
+    """Write FRAMES small images numbered in their pixels."""
+    for i in range(FRAMES):
+        image = np.full((8, 8, 3), i, np.uint8)
+        cv2.imwrite(os.path.join(directory, 'frame_%02d.png' % i), image)
+
+
+class PipelineTest(unittest.TestCase):
+    """Pipeline on an ImageDirSource with a fake Fly."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        make_images(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_to_end(self, f, mode, lossless):
+        """Play every image through a pipeline and return it stopped."""
+        cap = source.ImageDirSource(self.directory, mode, fps=200.0)
+        p = pipeline.Pipeline(f, cap, lossless)
+        p.start()
+        for t in p.threads:
+            t.join(5.0)
+        p.stop()
+        self.assertEqual(p.frame_count, FRAMES - cap.dropped)
+        return p, cap
+
+    def test_lossless(self):
+        """Replayed losslessly every frame is flown, in order."""
+        f = FakeFly(0.005)
+        p, cap = self.run_to_end(f, source.FAST, True)
+        self.assertEqual(f.frames, list(range(FRAMES)))
+        self.assertEqual(p.dropped + cap.dropped, 0)
+
+    def test_latest_frame_wins(self):
+        """A slow worker skips to the newest frame, counting the ones it
+           never saw, and still gets the last."""
+        f = FakeFly(0.02)
+        p, cap = self.run_to_end(f, source.FAST, False)
+        self.assertEqual(cap.dropped, 0)
+        self.assertGreater(p.dropped, 0)
+        self.assertEqual(len(f.frames) + p.dropped, FRAMES)
+        self.assertEqual(f.frames, sorted(set(f.frames)))
+        self.assertEqual(f.frames[-1], FRAMES - 1)
+
+    def test_realtime_drops(self):
+        """Frames a realtime replay skips to keep up are counted by the
+           source, and the rest by the pipeline."""
+        f = FakeFly(0.02)
+        p, cap = self.run_to_end(f, source.REALTIME, False)
+        self.assertGreater(cap.dropped + p.dropped, 0)
+        self.assertEqual(len(f.frames) + p.dropped + cap.dropped, FRAMES)
+        self.assertEqual(f.frames, sorted(set(f.frames)))
+
+    def test_stop_keys(self):
+        """Stop keys reach Fly at once, others with the next frame, and
+           the pipeline stops cleanly in the middle of a replay."""
+        f = FakeFly(0.1)
+        cap = source.ImageDirSource(self.directory, source.REALTIME, fps=5.0)
+        p = pipeline.Pipeline(f, cap)
+        p.start()
+        time.sleep(0.05)        # The worker is busy with frame 0.
+        p.key(ord('c'))
+        for ch in pipeline.STOP_KEYS:
+            p.key(ch)
+        with f.lock:
+            self.assertFalse(f.flying)
+            self.assertEqual(f.commands,
+                             [(ch, None) for ch in pipeline.STOP_KEYS])
+        time.sleep(0.3)         # Frame 1 was due at 0.2 s.
+        start = time.monotonic()
+        p.stop()
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertFalse(any(t.is_alive() for t in p.threads))
+        self.assertLess(p.frame_count, FRAMES)
+        with f.lock:
+            ch, number = f.commands[-1]
+        self.assertEqual(ch, ord('c'))
+        self.assertGreaterEqual(number, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests of pose accuracy against gates with known poses.
+
+Run from this directory with 'python3 -m unittest'.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import unittest
+import cv2
+import numpy as np
+import pose
+import synthetic
+
+class PositionMarkersTest(unittest.TestCase):
+    """position_markers() on exactly projected corners."""
+
+    def test_exact_corners(self):
+        """Corners projected into the undistorted image give back the
+           pose they were projected from."""
+        w, h = pose.CALIBRATION_SIZE
+        _, _, new_matrix = pose.undistort_maps(w, h)
+        objp = pose.Pose.target_objp
+        rvecs = np.array([[0.1], [-0.3], [0.05]])
+        tvecs = np.array([[10.0], [-5.0], [120.0]])
+        pts, _ = cv2.projectPoints(objp, rvecs, tvecs, new_matrix, None)
+        pts = pts.reshape(2, 1, 4, 2).astype(np.float32)
+        found, r, t = pose.position_markers([pts[0], pts[1]])
+        self.assertTrue(found)
+        self.assertLess(np.linalg.norm(t - tvecs), 0.01)
+        self.assertLess(synthetic.rotation_error(r, rvecs.ravel()), 0.01)
+
+    def test_marker_order(self):
+        """Gate corners come left hand marker first whatever order the
+           markers were detected in."""
+        left = np.zeros((1, 4, 2), np.float32)
+        right = left + [[100.0, 0.0]]
+        for markers in ([left, right], [right, left]):
+            corners = pose.gate_corners(markers)
+            self.assertEqual(corners.shape, (8, 2))
+            self.assertTrue((corners[:4] == left[0]).all())
+            self.assertTrue((corners[4:] == right[0]).all())
+
+
+class SyntheticAccuracyTest(unittest.TestCase):
+    """Pose.solve() on rendered gates, lens distortion included."""
+
+    COUNT = 60
+    DISTANCE = (40.0, 150.0)    # Near enough to always be found.
+    MAX_MEDIAN_CM = 1.5         # Was over 9 cm when corners were
+                                # distorted a second time in solvePnP.
+
+    def check_mode(self, undistort, size=pose.CALIBRATION_SIZE,
+                   distance=DISTANCE):
+        """Solve rendered size gates in undistort mode and check errors."""
+        gen = synthetic.Generator(2, size, blur=0.5, noise=2.0, seed=1)
+        p = pose.Pose(undistort)
+        errors = []
+        for frame, _, tvecs in gen.generate(self.COUNT, distance=distance):
+            if p.solve(frame, 2):
+                errors.append(np.linalg.norm(p.tvecs.ravel() - tvecs))
+        self.assertGreaterEqual(len(errors), self.COUNT*0.9)
+        self.assertLess(np.median(errors), self.MAX_MEDIAN_CM)
+
+    def test_undistort_image(self):
+        self.check_mode(pose.UNDISTORT_IMAGE)
+
+    def test_undistort_corners(self):
+        self.check_mode(pose.UNDISTORT_CORNERS)
+
+    def test_other_size(self):
+        """Half size frames are solved with the camera matrix scaled to
+           them, gates half as far away being found as often."""
+        for undistort in pose.UNDISTORT_MODES:
+            self.check_mode(undistort, (320, 240), (40.0, 75.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Regression test flying Fly in the simulator.
+
+Run from this directory with 'python3 -m unittest'.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import os
+import subprocess
+import sys
+import unittest
+import sitl
+
+class SitlTest(unittest.TestCase):
+    """sitl.py REGRESSION_ARGS."""
+
+    SEEDS = (1, 2, 3, 4, 5)
+
+    def test_regression(self):
+        """The current gains fly the expected gates in order and finish
+           still flying, whatever the seed."""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'sitl.py')
+        for seed in self.SEEDS:
+            with self.subTest(seed=seed):
+                result = subprocess.run([sys.executable, script] +
+                                        sitl.REGRESSION_ARGS +
+                                        ['--seed', str(seed)],
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        universal_newlines=True)
+                self.assertEqual(result.returncode, 0, result.stdout)
+                self.assertNotIn('stopping', result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
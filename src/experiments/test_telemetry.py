@@ -0,0 +1,108 @@
+"""Tests of telemetry reading against the fake transmitter.
+
+Run from this directory with 'python3 -m unittest'.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import os
+import time
+import unittest
+import command
+import faketransmitter
+import telemetry
+
+SENSORS = (telemetry.ACCX_ID, telemetry.ACCY_ID, telemetry.ACCZ_ID)
+
+def wait_for(condition, timeout=1.0):
+    """Wait for condition() to be true. Return True if it was."""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.001)
+    return False
+
+
+class RingBufferTest(unittest.TestCase):
+    """RingBuffer filling up and wrapping around."""
+
+    def test_wraparound(self):
+        """The newest samples are kept, oldest first."""
+        ring = telemetry.RingBuffer(4, 2)
+        self.assertEqual(len(ring.latest(4)), 0)
+        for i in range(3):
+            ring.add((i, 10*i))
+        self.assertEqual(ring.latest(4)[:, 0].tolist(), [0, 1, 2])
+        for i in range(3, 10):
+            ring.add((i, 10*i))
+        self.assertEqual(ring.count, 10)
+        self.assertEqual(ring.latest(100)[:, 0].tolist(), [6, 7, 8, 9])
+        self.assertEqual(ring.latest(2)[:, 1].tolist(), [80, 90])
+        self.assertEqual(ring.since(7.5)[:, 0].tolist(), [8, 9])
+
+
+class TelemetryTest(unittest.TestCase):
+    """Telemetry reading 'T' lines sent by FakeTransmitter."""
+
+    SIZE = 8
+
+    def setUp(self):
+        self.fake = faketransmitter.FakeTransmitter()
+        self.cmd = command.Command(self.fake.ttyname)
+        self.telemetry = telemetry.Telemetry(self.cmd, self.SIZE)
+        self.telemetry.start()
+        self.assertTrue(wait_for(lambda: self.fake.telemetry))
+
+    def tearDown(self):
+        self.telemetry.stop()
+        self.cmd.close()
+        self.fake.close()
+
+    def wait_for_samples(self, count):
+        """Wait for count samples. Return True if they arrived."""
+        return wait_for(lambda: self.telemetry.samples.count >= count)
+
+    def test_samples_wrap_around(self):
+        """Samples land in the ring buffer, the oldest overwritten."""
+        sent = [(SENSORS[i % 3], 100 + i) for i in range(self.SIZE + 4)]
+        start = time.monotonic()
+        for sensor, value in sent:
+            self.assertTrue(self.fake.send_telemetry(sensor, value))
+        self.assertTrue(self.wait_for_samples(len(sent)))
+        samples = self.telemetry.samples.latest(self.SIZE)
+        self.assertEqual(len(samples), self.SIZE)
+        self.assertEqual(
+            [(int(s), int(v)) for s, v in
+             samples[:, [telemetry.SENSOR, telemetry.VALUE]]],
+            sent[-self.SIZE:])
+        self.assertTrue((samples[:, telemetry.TIME] >= start).all())
+        self.assertTrue((samples[1:, telemetry.DEVICE_TIME] >=
+                         samples[:-1, telemetry.DEVICE_TIME]).all())
+        _, x, y, z = self.telemetry.latest_acceleration()
+        self.assertAlmostEqual(x, 1.09)
+        self.assertAlmostEqual(y, 1.10)
+        self.assertAlmostEqual(z, 1.11)
+
+    def test_line_parser(self):
+        """Bad 'T' lines are counted and other lines ignored."""
+        os.write(self.fake.master, b'T 1 2\r\n')
+        os.write(self.fake.master, b'T 1 2 x\r\n')
+        os.write(self.fake.master, b'hello\r\n')
+        self.fake.send_telemetry(telemetry.ACCX_ID, -25)
+        self.assertTrue(self.wait_for_samples(1))
+        self.assertEqual(self.telemetry.bad_lines, 2)
+        self.assertEqual(self.telemetry.samples.count, 1)
+        self.assertIsNone(self.telemetry.latest_acceleration())
+        sample = self.telemetry.samples.latest()[0]
+        self.assertEqual(sample[telemetry.SENSOR], telemetry.ACCX_ID)
+        self.assertEqual(sample[telemetry.VALUE], -25)
+
+
+if __name__ == "__main__":
+    unittest.main()
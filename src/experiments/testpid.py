@@ -19,7 +19,7 @@ def main():
     s = Simulate()
     p = pid.PID(True)
     p.set_output_limits(0.0, 10.0)
-    p.set_tunings(30.0, 5.0, 5.0, True)
+    p.set_tunings(300.0, 5.0, 5.0, True)
     p.set_set_point(8.0)
     now = 0.0
     p.prep_for_start(now, 0.0)
@@ -0,0 +1,133 @@
+"""Named timing spans recorded into fixed size latency histograms.
+
+Code brackets a stage with
+
+    t = timing.start()
+    ...
+    timing.stop('detect', t)
+
+and each stage name gets a histogram of its times. Histograms have
+fixed log spaced bins, allocated up front, from MIN_MS to MAX_MS with
+BINS_PER_DECADE bins per factor of ten, so recording a time is one
+bin increment and percentiles are good to about 12%. The maximum is
+kept exactly.
+
+Timing is off until enable() is called. While off start() and stop()
+return at once, so the spans can stay in the flying code.
+
+since_start() gives the seconds since the process started, for
+reporting start up time.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import math
+import os
+import time
+import numpy as np
+
+MIN_MS = 0.001
+MAX_MS = 10000.0
+BINS_PER_DECADE = 20
+BINS = int(round(math.log10(MAX_MS/MIN_MS)*BINS_PER_DECADE)) + 1
+
+PERCENTILES = (50, 95, 99)
+
+enabled = False
+histograms = {}     # Histogram by stage name.
+imported = time.time()  # Fallback start time where /proc is missing.
+
+class Histogram:
+    """Latency histogram of one stage in milliseconds."""
+
+    def __init__(self, name):
+        """Initialize empty histogram for stage name."""
+        self.name = name
+        self.counts = np.zeros(BINS, np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        """Add one time."""
+        if ms > MIN_MS:
+            i = min(int(math.log10(ms/MIN_MS)*BINS_PER_DECADE) + 1, BINS - 1)
+        else:
+            i = 0
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        """Return upper edge of the bin holding the q'th percentile."""
+        if self.count == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts),
+                                math.ceil(self.count*q/100.0)))
+        return min(MIN_MS*10**(i/BINS_PER_DECADE), self.max)
+
+    def __str__(self):
+        return "%-12s n:%7d avg:%8.3f %s max:%8.3f ms" % (
+            self.name, self.count, self.total/max(self.count, 1),
+            ' '.join('p%d:%8.3f' % (q, self.percentile(q))
+                     for q in PERCENTILES), self.max)
+
+
+def enable(on=True):
+    """Turn timing on or off."""
+    global enabled
+    enabled = on
+
+
+def reset():
+    """Forget all recorded times."""
+    histograms.clear()
+
+
+def start():
+    """Return start time of a span, or 0.0 if timing is off."""
+    if not enabled:
+        return 0.0
+    return time.perf_counter()
+
+
+def stop(name, t):
+    """End the span of stage name started at t from start()."""
+    if not enabled:
+        return
+    add(name, (time.perf_counter() - t)*1000)
+
+
+def add(name, ms):
+    """Record ms milliseconds for stage name."""
+    h = histograms.get(name)
+    if h is None:
+        h = histograms.setdefault(name, Histogram(name))
+    h.add(ms)
+
+
+def since_start():
+    """Return seconds since the process started, or since this module
+       was imported where the start time cannot be read."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22, counted after the parenthesized command name.
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - ticks/os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time() - imported
+
+
+def report():
+    """Print a line for every stage in the order first seen."""
+    for h in list(histograms.values()):
+        print(h)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+"""Search PID gains offline against a simulated plant.
+
+BatchPID steps thousands of PIDs at once, one per set of gains, with
+the same arithmetic as pid.PID.compute(): gains turned negative for a
+reverse acting PID, the integral and derivative scaled by the time
+step, proportional on error (also scaled by the time step) or on
+measurement, and the output clipped
+to its limits. '--check' runs it side by side with pid.PID to show
+they agree.
+
+Each PID drives its own copy of a plant, optionally seeing it only
+after '--delay' steps as the camera does. '--plant first-order' is the
+first order plant of testpid.py with a forward acting PID. '--plant
+quad' is the height of sitl.Quad: the throttle sets a climb rate it
+reaches with time constant sitl.Quad.TAU, and the height is its
+integral, seen a few frames late. Its PID acts in the direction and
+has the output limits and initial output of Fly's height PID. Each
+plant sets the defaults of the options it needs; '--direction',
+'--min-output', '--max-output', '--initial-output', '--set-point',
+'--dt', '--delay' and the gain ranges override them.
+
+Gains are scored on how far they overshoot the set point, how long
+they take to settle within '--band' of the step and the control
+effort, the total movement of the output. Gains that never settle
+come last. Gains come from a grid ('--grid') or are drawn at random,
+log uniformly, between the '--kp', '--ki' and '--kd' ranges.
+"""
+
+__author__ = "Steve Geyer"
+__copyright__ = "Copyright 2019, Steve Geyer"
+__credits__ = ["Steve Geyer"]
+__license__ = "BSD 3-Clause License"
+__version__ = "1.0.0"
+__status__ = "Development"
+
+import argparse
+import time
+import numpy as np
+import pid
+import sitl
+
+# Option defaults for each plant.
+PLANTS = {
+    'first-order': dict(direction='forward', min_output=0.0,
+                        max_output=10.0, initial_output=0.0, set_point=8.0,
+                        dt=0.1, delay=0, kp='0.01,500', ki='0,10',
+                        kd='0,10'),
+    # Fly's height PID at 30 frames/s, seeing about 100 ms late.
+    'quad': dict(direction='reverse', min_output=-1.0, max_output=1.0,
+                 initial_output=-1.0, set_point=50.0, dt=1/30.0, delay=3,
+                 kp='0.0001,1', ki='0,1', kd='0,1'),
+}
+
+class BatchPID:
+    """Many pid.PID controllers sharing limits, set point and time."""
+
+    def __init__(self, forward, kp, ki, kd, p_on_e, out_min, out_max,
+                 initial_output=0.0):
+        """Initialize PIDs with arrays of tunings, like PID.set_tunings()
+           called for each, and shared output limits."""
+        sign = 1.0 if forward else -1.0
+        self.kp = sign*np.asarray(kp, np.float64)
+        self.ki = sign*np.asarray(ki, np.float64)
+        self.kd = sign*np.asarray(kd, np.float64)
+        self.p_on_e = np.asarray(p_on_e, bool)
+        self.out_min = out_min
+        self.out_max = out_max
+        self.output = np.clip(np.full(self.kp.shape, initial_output,
+                                      np.float64), out_min, out_max)
+        self.set_point = 0.0
+        self.last_time = 0.0
+        self.last_input = np.zeros(self.kp.shape)
+
+    def set_set_point(self, set_point):
+        """Set the set point."""
+        self.set_point = set_point
+
+    def prep_for_start(self, now, input_value):
+        """Set time and input baseline."""
+        self.last_time = now
+        self.last_input = np.broadcast_to(
+            np.asarray(input_value, np.float64), self.kp.shape).copy()
+
+    def compute(self, now, input_value):
+        """Take time and array of inputs and return the new outputs."""
+        time_change = now - self.last_time
+        if time_change <= 0:
+            return self.output
+        ki = self.ki*time_change
+        kd = self.kd/time_change
+        input_error = self.set_point - input_value
+        d_input = input_value - self.last_input
+        self.last_input = np.array(input_value, np.float64)
+        self.last_time = now
+        self.output += ki*input_error
+        p_term = self.kp*np.where(self.p_on_e, input_error, d_input)
+        self.output -= np.where(self.p_on_e, p_term*time_change, p_term)
+        self.output -= kd*d_input
+        np.clip(self.output, self.out_min, self.out_max, out=self.output)
+        return self.output
+
+
+class Plant:
+    """First order plants, as in testpid.py, seen after delay steps."""
+
+    TIME_CONSTANT = 0.97
+
+    def __init__(self, n, time_constant=TIME_CONSTANT, delay=0):
+        """Initialize n plants at zero."""
+        self.time_constant = time_constant
+        self.out = np.zeros(n)
+        self.seen = [np.zeros(n) for _ in range(delay)]
+
+    def measure(self):
+        """Return the plant outputs as seen by the controller."""
+        if self.seen:
+            return self.seen[0]
+        return self.out
+
+    def update(self, value):
+        """Drive the plants with value for one step."""
+        self.out = (self.out*self.time_constant +
+                    value*(1.0 - self.time_constant))
+        if self.seen:
+            self.seen.pop(0)
+            self.seen.append(self.out)
+
+
+class QuadHeight(Plant):
+    """Heights (cm) of sitl.Quad quadcopters driven by the throttle,
+       seen after delay steps."""
+
+    def __init__(self, n, dt, delay=0):
+        """Initialize n quadcopters hovering at zero height."""
+        super().__init__(n, delay=delay)
+        self.dt = dt
+        self.climb = np.zeros(n)
+
+    def update(self, value):
+        """Drive the quadcopters with throttle value for one step."""
+        k = min(self.dt/sitl.Quad.TAU, 1.0)
+        self.climb += (value*sitl.Quad.MAX_CLIMB - self.climb)*k
+        self.out = self.out + self.climb*self.dt
+        if self.seen:
+            self.seen.pop(0)
+            self.seen.append(self.out)
+
+
+def make_plant(n, args):
+    """Return n copies of the plant args name."""
+    if args.plant == 'quad':
+        return QuadHeight(n, args.dt, args.delay)
+    return Plant(n, args.time_constant, args.delay)
+
+def simulate(gains, args):
+    """Run the PIDs for gains (columns kp, ki, kd, p_on_e) against the
+       plant and return (overshoot %, settling s, effort) arrays."""
+    n = len(gains)
+    p = BatchPID(args.direction == 'forward', gains[:, 0], gains[:, 1],
+                 gains[:, 2], gains[:, 3] > 0, args.min_output,
+                 args.max_output, args.initial_output)
+    p.set_set_point(args.set_point)
+    plant = make_plant(n, args)
+    now = 0.0
+    p.prep_for_start(now, 0.0)
+    band = abs(args.set_point)*args.band/100
+    peak = np.zeros(n)
+    last_out = np.zeros(n)      # Last time outside the band.
+    effort = np.zeros(n)
+    last = p.output.copy()
+    for step in range(args.steps):
+        now += args.dt
+        o = p.compute(now, plant.measure())
+        plant.update(o)
+        peak = np.maximum(peak, plant.out)
+        last_out[np.abs(plant.out - args.set_point) > band] = now
+        effort += np.abs(o - last)
+        last = o.copy()
+    overshoot = np.maximum(peak - args.set_point, 0)/abs(args.set_point)*100
+    settling = np.where(last_out >= now, np.inf, last_out)
+    return overshoot, settling, effort
+
+def make_gains(args, rng):
+    """Return rows of (kp, ki, kd, p_on_e) to try."""
+    ranges = [tuple(float(v) for v in r.split(','))
+              for r in (args.kp, args.ki, args.kd)]
+    if args.grid:
+        axes = [np.geomspace(max(lo, 1e-6), hi, args.grid) if lo < hi
+                else np.array([lo]) for lo, hi in ranges]
+        axes.append(np.array([0.0, 1.0]))
+        return np.stack(np.meshgrid(*axes, indexing='ij'), -1).reshape(-1, 4)
+    gains = np.empty((args.count, 4))
+    for i, (lo, hi) in enumerate(ranges):
+        if lo < hi:
+            gains[:, i] = np.exp(rng.uniform(np.log(max(lo, 1e-6)),
+                                             np.log(hi), args.count))
+        else:
+            gains[:, i] = lo
+    gains[:, 3] = rng.randint(0, 2, args.count)
+    return gains
+
+def check(args, rng, n=100):
+    """Return the largest difference between BatchPID and pid.PID."""
+    gains = make_gains(argparse.Namespace(**dict(vars(args), grid=0,
+                                                 count=n)), rng)
+    forward = args.direction == 'forward'
+    batch = BatchPID(forward, gains[:, 0], gains[:, 1], gains[:, 2],
+                     gains[:, 3] > 0, args.min_output, args.max_output,
+                     args.initial_output)
+    batch.set_set_point(args.set_point)
+    single = []
+    for kp, ki, kd, p_on_e in gains:
+        p = pid.PID(forward)
+        p.set_output_limits(args.min_output, args.max_output)
+        p.set_initial_output(args.initial_output)
+        p.set_tunings(kp, ki, kd, p_on_e > 0)
+        p.set_set_point(args.set_point)
+        single.append(p)
+    plant = make_plant(n, args)
+    now = 0.0
+    batch.prep_for_start(now, 0.0)
+    for p in single:
+        p.prep_for_start(now, 0.0)
+    worst = 0.0
+    for _ in range(args.steps):
+        now += args.dt
+        seen = plant.measure()
+        o = batch.compute(now, seen).copy()
+        expect = np.array([p.compute(now, v) for p, v in zip(single, seen)])
+        worst = max(worst, np.abs(o - expect).max())
+        plant.update(o)
+    return worst
+
+def main():
+    """Execute the command"""
+    parser = argparse.ArgumentParser(description='Search PID gains')
+    parser.add_argument('-n', '--count',
+                        help='random gains to try',
+                        required=False, type=int, default=10000)
+    parser.add_argument('-g', '--grid',
+                        help='try a grid of this many values per gain '
+                        'instead of random gains',
+                        required=False, type=int, default=0)
+    parser.add_argument('--plant', help='plant to control',
+                        required=False, choices=list(PLANTS),
+                        default='first-order')
+    parser.add_argument('--direction', help='PID direction',
+                        required=False, choices=('forward', 'reverse'),
+                        default=None)
+    parser.add_argument('--kp', help='kp range "min,max"',
+                        required=False, default=None)
+    parser.add_argument('--ki', help='ki range "min,max"',
+                        required=False, default=None)
+    parser.add_argument('--kd', help='kd range "min,max"',
+                        required=False, default=None)
+    parser.add_argument('--set-point', help='step to reach',
+                        required=False, type=float, default=None)
+    parser.add_argument('--min-output', help='lowest PID output',
+                        required=False, type=float, default=None)
+    parser.add_argument('--max-output', help='highest PID output',
+                        required=False, type=float, default=None)
+    parser.add_argument('--initial-output', help='PID output at the start',
+                        required=False, type=float, default=None)
+    parser.add_argument('--time-constant', help='plant time constant',
+                        required=False, type=float,
+                        default=Plant.TIME_CONSTANT)
+    parser.add_argument('--delay', help='steps before the PID sees the plant',
+                        required=False, type=int, default=None)
+    parser.add_argument('--dt', help='seconds per step',
+                        required=False, type=float, default=None)
+    parser.add_argument('--steps', help='steps to simulate',
+                        required=False, type=int, default=300)
+    parser.add_argument('--band', help='settled within this percent of the '
+                        'step', required=False, type=float, default=2.0)
+    parser.add_argument('--overshoot-weight',
+                        help='seconds of settling one percent of '
+                        'overshoot costs',
+                        required=False, type=float, default=0.5)
+    parser.add_argument('--effort-weight',
+                        help='seconds of settling one unit of effort costs',
+                        required=False, type=float, default=0.05)
+    parser.add_argument('-t', '--top', help='best gains to show',
+                        required=False, type=int, default=10)
+    parser.add_argument('--check', help='compare against pid.PID first',
+                        required=False, action='store_true')
+    parser.add_argument('--seed', help='random seed',
+                        required=False, type=int, default=None)
+    args = parser.parse_args()
+    for name, value in PLANTS[args.plant].items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    rng = np.random.RandomState(args.seed)
+
+    if args.check:
+        print("largest difference from pid.PID: %g" % check(args, rng))
+
+    gains = make_gains(args, rng)
+    t = time.perf_counter()
+    overshoot, settling, effort = simulate(gains, args)
+    elapsed = time.perf_counter() - t
+    score = (settling + args.overshoot_weight*overshoot +
+             args.effort_weight*effort)
+    order = np.argsort(score)
+    print("simulated %d gains x %d steps in %.2f s, %d settled" % (
+        len(gains), args.steps, elapsed, np.isfinite(settling).sum()))
+    print()
+    print('%10s %10s %10s %6s %10s %10s %10s %10s' % (
+        'kp', 'ki', 'kd', 'p_on_e', 'overshoot', 'settle s', 'effort',
+        'score'))
+    for i in order[:args.top]:
+        print('%10.4f %10.4f %10.4f %6s %9.2f%% %10.2f %10.2f %10.2f' % (
+            gains[i, 0], gains[i, 1], gains[i, 2], gains[i, 3] > 0,
+            overshoot[i], settling[i], effort[i], score[i]))
+
+if __name__ == "__main__":
+    main()
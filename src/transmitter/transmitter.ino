@@ -64,11 +64,20 @@ enum {
 
 const int MAX_BUFFER = 32;
 
+// Binary stick commands are the sync byte, the four stick channels
+// packed 11 bits each least significant bit first (like sendData()),
+// and a CRC-8 (polynomial 0x07) of the packed channels.
+const uint8_t binarySync = 0xA5;
+const int binaryPayloadSize = 6;
+const int binaryFrameSize = binaryPayloadSize + 1; // Bytes after sync.
+
 enum {
     FIRST_CHAR,                 // Standard first char processing.
     ARROW_1,                    // Saw 0x1B in arrow sequence.
     ARROW_2,                    // Saw 0x5B in arrow sequence.
-    BUF_COMMAND                 // Saw '!' and not capturing line.
+    BUF_COMMAND,                // Saw '!' and not capturing line.
+    BIN_COMMAND,                // Saw binarySync and capturing frame.
+    BIN_RESYNC                  // Bad frame, skipping to binarySync.
 } charState;
 
 static runState_t runState;
@@ -76,6 +85,9 @@ static runState_t runState;
 static char buffer[MAX_BUFFER];
 static int bufIndex = 0;
 
+static uint8_t binBuffer[binaryFrameSize];
+static int binIndex = 0;
+
 static uint8_t rxBuf[FRSKY_SPORT_PACKET_SIZE];
 static int rxBufCount;
 
@@ -94,13 +106,17 @@ static uint16_t data[numChannels]; // Data channels.
 const int debugSize = 100;
 static char lastOutput[debugSize];
 static bool debugOutput = false;
+static bool telemetryOutput = false; // Forward telemetry to the computer.
 
 static void     setDefaultParams();
 static void     processCommand();
 static void     processSingleChar(char ch);
 static void     processBuffer(char *buffer);
+static bool     processBinary(uint8_t *buffer);
+static uint8_t  crc8(const uint8_t *data, int len);
 static void     startBindAndArm();
 static void     processTelemetryByte(uint8_t data);
+static void     sportProcessPacket();
 static void     dumpTelemetry();
 static uint16_t limit(uint16_t val);
 static void     sendByte(uint8_t b);
@@ -140,9 +156,9 @@ void loop() {
     if (Serial.available()) {
         processCommand();
     }
-//    if (Serial1.available()) {
-//        processTelemetryByte(Serial1.read());
-//    }
+    if (telemetryOutput && Serial1.available()) {
+        processTelemetryByte(Serial1.read());
+    }
     if (nextSample()) {
         if ((packetCount % setupFrameCount) == 0) {
             sendChannelUpdate();
@@ -169,6 +185,9 @@ static void processCommand() {
             } else if (ch == '!') {
                 bufIndex = 0;
                 charState = BUF_COMMAND;
+            } else if ((uint8_t)ch == binarySync) {
+                binIndex = 0;
+                charState = BIN_COMMAND;
             } else {
                 processSingleChar(ch);
             }
@@ -200,6 +219,28 @@ static void processCommand() {
                 buffer[bufIndex++] = ch;
             }
             break;
+        case BIN_COMMAND:
+            binBuffer[binIndex++] = (uint8_t)ch;
+            if (binIndex >= binaryFrameSize) {
+                // A bad frame means we lost our place in the stream, so
+                // the bytes that follow are stick bits, not commands.
+                if (processBinary(binBuffer)) {
+                    charState = FIRST_CHAR;
+                } else {
+                    charState = BIN_RESYNC;
+                }
+            }
+            break;
+        case BIN_RESYNC:
+            // Only a sync byte or a disarm gets through until a good
+            // frame has been read.
+            if ((uint8_t)ch == binarySync) {
+                binIndex = 0;
+                charState = BIN_COMMAND;
+            } else if (ch == 'd') {
+                processSingleChar(ch);
+            }
+            break;
         }
     }
 }
@@ -231,6 +272,13 @@ static void processSingleChar(char ch) {
         // Do nothing.
     } else if (ch == 'D') {
         debugOutput = !debugOutput;
+    } else if (ch == 'T') {
+        telemetryOutput = true;
+    } else if (ch == 't') {
+        telemetryOutput = false;
+    } else if (ch == 'B') {
+        // Tell the computer we take binary stick commands.
+        Serial.println("BIN 1");
     } else {
         Serial.print("Unknown command: '");
         Serial.print(ch);
@@ -248,6 +296,46 @@ static void processBuffer(char *buffer) {
     spin = (uint16_t)strtol(p, &p, 10);
 }
 
+static bool processBinary(uint8_t *buffer) {
+    if (crc8(buffer, binaryPayloadSize) != buffer[binaryPayloadSize]) {
+        return false;
+    }
+
+    uint16_t values[4];
+    uint32_t bits = 0;
+    uint8_t avail = 0;
+    int index = 0;
+    for (int channel = 0; channel < 4; channel++) {
+        while (avail < channelBits) {
+            bits |= ((uint32_t)buffer[index++]) << avail;
+            avail += 8;
+        }
+        values[channel] = bits & ((1 << channelBits) - 1);
+        bits >>= channelBits;
+        avail -= channelBits;
+    }
+    throttle = values[0];
+    direction = values[1];
+    forward = values[2];
+    spin = values[3];
+    return true;
+}
+
+static uint8_t crc8(const uint8_t *data, int len) {
+    uint8_t crc = 0;
+    for (int i = 0; i < len; i++) {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++) {
+            if (crc & 0x80) {
+                crc = (crc << 1) ^ 0x07;
+            } else {
+                crc <<= 1;
+            }
+        }
+    }
+    return crc;
+}
+
 static void startBindAndArm() {
     runState = BIND;
     timeoutTicks = bindTimeOut;
@@ -312,16 +400,11 @@ static void sportProcessPacket() {
         return;
     }
 
-    const char* name = "";
-    switch (sensorID) {
-        case ACCX_FIRST_ID: name = "X"; break;
-        case ACCY_FIRST_ID: name = "Y"; break;
-        case ACCZ_FIRST_ID: name = "Z"; break;
-    }
-
+    // Forward as "T <millis> <sensorID> <value>" for the computer.
+    Serial.print("T ");
     Serial.print(millis());
-    Serial.print(": ");
-    Serial.print(name);
+    Serial.print(" ");
+    Serial.print(sensorID);
     Serial.print(" ");
     Serial.println(value);
 }
@@ -465,6 +548,9 @@ static void help() {
     Serial.println();
     Serial.println(" !<throttle> <left/right> <forward/back> <rotation> -- "
                    "command all parameters with values (204 to 1907)");
+    Serial.println(" B -- check for binary stick commands (replies BIN 1)");
+    Serial.println(" T -- start forwarding telemetry");
+    Serial.println(" t -- stop forwarding telemetry");
     Serial.println();
     Serial.println(" D -- toggle debugging output");
     Serial.println();